@@ -1,10 +1,24 @@
 # General python libs
-import sys, requests, json, os
+import sys, os, time
 from urllib.parse import parse_qsl
 
 # Kodi libs
 import xbmcgui, xbmcaddon, xbmcplugin, xbmcvfs, xbmc
 
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, arr_post, configured_instances, instance_name, manager_type, INSTANCES
+from resources.lib.store import get_profiles, get_profile, replace_profile_settings, get_profile_setting
+from resources.lib.reference import get_reference, revalidate
+from resources.lib.rootfolders import choose_root_folder
+from resources.lib.monitor import hand_off_command, get_command_status, check_content_status, wait_for_search_command, service_is_running, wake_journal, invalidate_widgets, dump_service_log, COMMAND_TIMEOUT
+from resources.lib.episodes import parse_episode_scope, season_monitoring
+from resources.lib.singleflight import SingleFlight
+from resources.lib.durations import estimate_duration, record_duration, next_poll_delay, parse_duration, estimated_progress
+from resources.lib.metadata import get_title
+from resources.lib.library import library_check, library_add, library_fetch, update_library_index, build_add_payload, build_search_command, is_already_added_error
+from resources.lib.metrics import span, summarize, format_summary, export_summary, flush as flush_metrics
+
 # The plugin is called with these arguments (strings)
 # arg 0: Plugin URL ("plugin://plugin.module.helparr/")
 # arg 1: Handle
@@ -18,136 +32,33 @@ PLUGIN_PARAMS   = dict(parse_qsl(sys.argv[2][1:]))
 PLUGIN_PATH     = xbmcaddon.Addon().getAddonInfo("path")
 
 
-def arr_get(manager, api_path, arguments):
-    if manager == "Radarr":
-        address = xbmcaddon.Addon().getSetting("radarr_addr")
-        api_key = xbmcaddon.Addon().getSetting("radarr_api")
-    elif manager == "Sonarr":
-        address = xbmcaddon.Addon().getSetting("sonarr_addr")
-        api_key = xbmcaddon.Addon().getSetting("sonarr_api")
-    else:
-        response = "Internal error"
-        status = False
-    
-    url = f"{address}/api/v3/{api_path}?apikey={api_key}&{arguments}"
-    
-    status = False
-    try:
-        response = requests.get(url, timeout=3)
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        response = f"HTTP Error:\n{repr(e)}"
-    except requests.exceptions.ConnectionError as e:
-        response = f"Error Connecting:\n{repr(e)}"
-    except requests.exceptions.Timeout as e:
-        response = f"Timeout Error:\n{repr(e)}"
-    except requests.exceptions.RequestException as e:
-        response = f"Error:\n{repr(e)}"
-    else:
-        status = True
-    
-    return status, response
-
-def arr_post(manager, api_path, data):
-    if manager == "Radarr":
-        address = xbmcaddon.Addon().getSetting("radarr_addr")
-        api_key = xbmcaddon.Addon().getSetting("radarr_api")
-    elif manager == "Sonarr":
-        address = xbmcaddon.Addon().getSetting("sonarr_addr")
-        api_key = xbmcaddon.Addon().getSetting("sonarr_api")
-    else:
-        response = "Internal error"
-        status = False
-    
-    url = f"{address}/api/v3/{api_path}?apikey={api_key}"
-    
-    status = False
-    try:
-        response = requests.post(url, json=data, timeout=3)
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        response = f"HTTP Error:\n{repr(e)}"
-    except requests.exceptions.ConnectionError as e:
-        response = f"Error Connecting:\n{repr(e)}"
-    except requests.exceptions.Timeout as e:
-        response = f"Timeout Error:\n{repr(e)}"
-    except requests.exceptions.RequestException as e:
-        response = f"Error:\n{repr(e)}"
-    else:
-        status = True
-    
-    if status:
-        response_json = response.json()
-        if response_json.get("severity") == "error":
-            response = response_json.get("errorMessage")
-            status = False
-        else:
-            response = response_json
-    
-    return status, response
-
-def get_cache_path():
-    """Get the addon cache directory path"""
-    addon_data_path = xbmcvfs.translatePath("special://userdata/addon_data/plugin.module.helparr/")
-    if not xbmcvfs.exists(addon_data_path):
-        xbmcvfs.mkdirs(addon_data_path)
-    return addon_data_path
-
-def fetch_quality_profiles(manager):
-    """Fetch quality profiles from Radarr/Sonarr API"""
-    xbmc.log(f"[HELPARR] Fetching quality profiles for {manager}", xbmc.LOGINFO)
-    
-    status, response = arr_get(manager, "qualityprofile", "")
-    if status and isinstance(response.json() if hasattr(response, 'json') else response, list):
-        profiles = response.json() if hasattr(response, 'json') else response
-        xbmc.log(f"[HELPARR] Found {len(profiles)} quality profiles for {manager}", xbmc.LOGINFO)
-        return profiles
-    else:
-        xbmc.log(f"[HELPARR] Failed to fetch quality profiles for {manager}: {response}", xbmc.LOGERROR)
-        return []
-
-def cache_quality_profiles(manager, profiles):
-    """Cache quality profiles to addon data folder"""
-    cache_path = get_cache_path()
-    cache_file = os.path.join(cache_path, f"{manager.lower()}_profiles.json")
-    
-    try:
-        with open(cache_file, 'w') as f:
-            json.dump(profiles, f)
-        xbmc.log(f"[HELPARR] Cached {len(profiles)} quality profiles for {manager}", xbmc.LOGINFO)
-        return True
-    except Exception as e:
-        xbmc.log(f"[HELPARR] Failed to cache quality profiles for {manager}: {e}", xbmc.LOGERROR)
-        return False
-
 def load_cached_quality_profiles(manager):
-    """Load cached quality profiles from addon data folder"""
-    cache_path = get_cache_path()
-    cache_file = os.path.join(cache_path, f"{manager.lower()}_profiles.json")
-    
+    """Load quality profiles from the reference cache, refreshed in the background when stale"""
     try:
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as f:
-                profiles = json.load(f)
-            xbmc.log(f"[HELPARR] Loaded {len(profiles)} cached quality profiles for {manager}", xbmc.LOGINFO)
-            return profiles
+        profiles = get_reference(manager, "qualityprofile")
+        log.debug("Loaded %s cached quality profiles for %s", len(profiles), manager)
+        return profiles
     except Exception as e:
-        xbmc.log(f"[HELPARR] Failed to load cached quality profiles for {manager}: {e}", xbmc.LOGERROR)
+        log.error("Failed to load cached quality profiles for %s: %s", manager, e)
     
     return []
 
+def default_quality_profile(manager):
+    """Get the profile ID used when no profile was chosen, the first one of the server"""
+    profiles = load_cached_quality_profiles(manager)
+    return profiles[0]["id"] if profiles else 1
+
 def refresh_quality_profiles(manager):
     """Refresh quality profiles for a specific manager"""
-    xbmc.log(f"[HELPARR] Refreshing quality profiles for {manager}", xbmc.LOGINFO)
+    log.debug("Refreshing quality profiles for %s", manager)
     
     # Show progress dialog
     progress = xbmcgui.DialogProgress()
     progress.create("Refreshing Quality Profiles", f"Fetching {manager} quality profiles...")
     
     try:
-        profiles = fetch_quality_profiles(manager)
-        if profiles:
-            cache_quality_profiles(manager, profiles)
+        if revalidate(manager, "qualityprofile", force=True):
+            profiles = get_profiles(manager)
             progress.update(100, f"Successfully refreshed {len(profiles)} profiles")
             xbmc.sleep(1000)  # Show success for 1 second
             return True
@@ -158,23 +69,45 @@ def refresh_quality_profiles(manager):
     finally:
         progress.close()
 
+def refresh_profiles_action(manager):
+    """Refresh the profiles and settings dropdown, one invocation at a time"""
+    flight = SingleFlight(f"{manager}.profiles")
+    result = flight.acquire_or_wait()
+    if result is not None:
+        # Another invocation just did the refresh and reported its outcome
+        log.debug("%s profiles were refreshed by another invocation, success: %s", manager, result)
+        return result
+    
+    success = False
+    try:
+        success = refresh_quality_profiles(manager)
+        if success:
+            # Update settings dropdown
+            update_quality_profile_settings(manager)
+    finally:
+        flight.release(success)
+    
+    if not success:
+        xbmcgui.Dialog().ok("Error", f"Failed to refresh {manager} quality profiles.\nCheck your {manager} connection settings.")
+    return success
+
 def get_quality_profile_by_id(manager, profile_id):
     """Get quality profile name by ID"""
-    profiles = load_cached_quality_profiles(manager)
-    for profile in profiles:
-        if profile.get("id") == profile_id:
-            return profile.get("name", f"Profile {profile_id}")
+    profile = get_profile(manager, profile_id)
+    if profile:
+        return profile.get("name", f"Profile {profile_id}")
     return f"Profile {profile_id}"
 
-def update_quality_profile_settings(manager):
-    """Update the quality profile dropdown settings after refresh"""
-    profiles = load_cached_quality_profiles(manager)
+def update_quality_profile_settings(*managers):
+    """Update the quality profile dropdown settings of the managers after refresh"""
+    profiles = {manager: get_profiles(manager) for manager in managers}
+    for manager in managers:
+        if not profiles[manager]:
+            log.warning("No profiles to update for %s", manager)
+            del profiles[manager]
     if not profiles:
-        xbmc.log(f"[HELPARR] No profiles to update for {manager}", xbmc.LOGWARNING)
         return
     
-    xbmc.log(f"[HELPARR] Updating settings.xml with {len(profiles)} quality profiles for {manager}", xbmc.LOGINFO)
-    
     # Read current settings.xml
     settings_path = os.path.join(PLUGIN_PATH, "resources", "settings.xml")
     
@@ -182,43 +115,80 @@ def update_quality_profile_settings(manager):
         with open(settings_path, 'r', encoding='utf-8') as f:
             settings_content = f.read()
         
-        # Create values and lvalues for the setting
-        profile_names = ["Ask"] + [profile['name'].replace("|", "") for profile in profiles]  # Remove | chars that could break XML
-        values = "|".join(profile_names)
-        
-        # Create label values (we'll just use the profile names as labels)
-        lvalues = "30403"  # "Ask" label
-        for i, profile in enumerate(profiles):
-            # For now, we'll create a simple numbering system for labels
-            # In a real implementation, you'd want to add these to strings.po
-            lvalues += f"|{profile['name']}"
-        
-        # Update the settings content
-        setting_id = f"{manager.lower()}_quality_profile"
-        old_pattern = f'<setting label=".*?" type="select"    id="{setting_id}" default="0" values=".*?" lvalues=".*?"/>'
-        new_setting = f'<setting label="30{2 if manager == "Radarr" else 3}05" type="select"    id="{setting_id}" default="0" values="{values}" lvalues="{lvalues}"/>'
-        
         import re
-        updated_content = re.sub(old_pattern, new_setting, settings_content)
+        for manager, manager_profiles in profiles.items():
+            log.debug("Updating settings.xml with %s quality profiles for %s", len(manager_profiles), manager)
+            
+            # Create values and lvalues for the setting
+            profile_names = ["Ask"] + [profile['name'].replace("|", "") for profile in manager_profiles]  # Remove | chars that could break XML
+            values = "|".join(profile_names)
+            
+            # Create label values (we'll just use the profile names as labels)
+            lvalues = "30403"  # "Ask" label
+            for i, profile in enumerate(manager_profiles):
+                # For now, we'll create a simple numbering system for labels
+                # In a real implementation, you'd want to add these to strings.po
+                lvalues += f"|{profile['name']}"
+            
+            # Update the settings content
+            setting_id = f"{manager.lower()}_quality_profile"
+            old_pattern = f'<setting label="(.*?)" type="select"    id="{setting_id}" default="0" values=".*?" lvalues=".*?"/>'
+            new_setting = f'type="select"    id="{setting_id}" default="0" values="{values}" lvalues="{lvalues}"/>'
+            settings_content = re.sub(old_pattern, lambda match: f'<setting label="{match.group(1)}" {new_setting}', settings_content)
         
-        # Write back the updated settings
+        # Write back the updated settings once for all managers
         with open(settings_path, 'w', encoding='utf-8') as f:
-            f.write(updated_content)
+            f.write(settings_content)
         
-        xbmc.log(f"[HELPARR] Successfully updated settings.xml for {manager}", xbmc.LOGINFO)
+        log.debug("Successfully updated settings.xml for %s", ', '.join(profiles))
         
         # Store profile mapping for later use
-        profile_mapping = {i+1: profile['id'] for i, profile in enumerate(profiles)}
-        cache_path = get_cache_path()
-        mapping_file = os.path.join(cache_path, f"{manager.lower()}_profile_mapping.json")
-        
-        with open(mapping_file, 'w') as f:
-            json.dump(profile_mapping, f)
-        
-        xbmc.log(f"[HELPARR] Saved profile mapping for {manager}: {profile_mapping}", xbmc.LOGINFO)
+        for manager, manager_profiles in profiles.items():
+            profile_mapping = {i+1: profile['id'] for i, profile in enumerate(manager_profiles)}
+            replace_profile_settings(manager, profile_mapping)
+            log.debug("Saved profile mapping for %s: %s", manager, log.Payload(profile_mapping))
         
     except Exception as e:
-        xbmc.log(f"[HELPARR] Failed to update settings.xml for {manager}: {e}", xbmc.LOGERROR)
+        log.error("Failed to update settings.xml for %s: %s", ', '.join(profiles), e)
+
+def sync_all_action():
+    """Fetch all reference data of both managers at once and update the settings"""
+    from resources.lib.sync import sync_all
+    
+    flight = SingleFlight("sync")
+    result = flight.acquire_or_wait()
+    if result is not None:
+        log.debug("Sync was done by another invocation, success: %s", result)
+        return result
+    
+    progress = xbmcgui.DialogProgress()
+    progress.create("Sync All", "Fetching Radarr and Sonarr data...")
+    lines = []
+    
+    def report(done, total, result):
+        manager, endpoint, success, seconds = result
+        lines.append(f"{manager} {endpoint}: {f'{int(seconds * 1000)} ms' if success else 'failed'}")
+        progress.update(int(done * 100 / total), "\n".join(lines[-3:]))
+    
+    success = False
+    try:
+        started = time.time()
+        instances = configured_instances()
+        results = sync_all(instances, report)
+        elapsed = time.time() - started
+        synced = [manager for manager in instances if any(r[0] == manager and r[1] == "qualityprofile" and r[2] for r in results)]
+        update_quality_profile_settings(*synced)
+        success = bool(results) and all(r[2] for r in results)
+    finally:
+        progress.close()
+        flight.release(success)
+    
+    if not results:
+        xbmcgui.Dialog().ok("Sync All", "No Radarr or Sonarr server is configured.")
+    else:
+        lines.append(f"Total: {int(elapsed * 1000)} ms")
+        xbmcgui.Dialog().textviewer("Sync All", "\n".join(lines))
+    return success
 
 def get_profile_id_from_setting(manager, setting_index):
     """Convert setting index to actual profile ID"""
@@ -226,107 +196,121 @@ def get_profile_id_from_setting(manager, setting_index):
         return None  # Will trigger dialog
     
     try:
-        cache_path = get_cache_path()
-        mapping_file = os.path.join(cache_path, f"{manager.lower()}_profile_mapping.json")
-        
-        if os.path.exists(mapping_file):
-            with open(mapping_file, 'r') as f:
-                profile_mapping = json.load(f)
-            
-            # Convert string keys back to int for lookup
-            profile_mapping = {int(k): v for k, v in profile_mapping.items()}
-            
-            setting_idx = int(setting_index)
-            if setting_idx in profile_mapping:
-                profile_id = profile_mapping[setting_idx]
-                xbmc.log(f"[HELPARR] Mapped setting index {setting_idx} to profile ID {profile_id}", xbmc.LOGINFO)
-                return profile_id
+        setting_idx = int(setting_index)
+        profile_id = get_profile_setting(manager, setting_idx)
+        if profile_id is not None:
+            log.debug("Mapped setting index %s to profile ID %s", setting_idx, profile_id)
+            # The profile may have been deleted on the server since the dropdown was built
+            profiles = load_cached_quality_profiles(manager)
+            if profiles and profile_id not in [p["id"] for p in profiles]:
+                log.warning("%s profile ID %s no longer exists", manager, profile_id)
+                return None
+            return profile_id
     except Exception as e:
-        xbmc.log(f"[HELPARR] Error getting profile ID from setting: {e}", xbmc.LOGERROR)
+        log.error("Error getting profile ID from setting: %s", e)
     
-    return 1  # Default fallback
+    return None
 
 def get_selected_quality_profile(manager):
     """Get the selected quality profile ID based on settings"""
     profile_setting = f"{manager.lower()}_quality_profile"
     setting_value = xbmcaddon.Addon().getSetting(profile_setting)
     
-    xbmc.log(f"[HELPARR] {manager} quality profile setting: {setting_value}", xbmc.LOGINFO)
+    log.debug("%s quality profile setting: %s", manager, setting_value)
     
     if setting_value == "0":  # Ask
         # Show dialog to select quality profile
         profiles = load_cached_quality_profiles(manager)
         if not profiles:
-            xbmc.log(f"[HELPARR] No cached profiles for {manager}, using default", xbmc.LOGWARNING)
-            return 1  # Default fallback
+            log.warning("No cached profiles for %s, using default", manager)
+            return 1  # Default fallback, there is no profile to pick from
         
         profile_names = [f"{p['name']}" for p in profiles]
-        selected = xbmcgui.Dialog().select(f"Select {manager} Quality Profile", profile_names)
+        with span("dialog", manager):
+            selected = xbmcgui.Dialog().select(f"Select {manager} Quality Profile", profile_names)
         
         if selected >= 0:
             profile_id = profiles[selected]["id"]
-            xbmc.log(f"[HELPARR] User selected {manager} profile: {profiles[selected]['name']} (ID: {profile_id})", xbmc.LOGINFO)
+            log.debug("User selected %s profile: %s (ID: %s)", manager, profiles[selected]['name'], profile_id)
             return profile_id
         else:
-            xbmc.log(f"[HELPARR] User cancelled {manager} profile selection, using default", xbmc.LOGINFO)
-            return 1  # Default fallback
+            log.debug("User cancelled %s profile selection, using default", manager)
+            return profiles[0]["id"]  # Default fallback
     else:
         # Use fixed profile from setting
         profile_id = get_profile_id_from_setting(manager, setting_value)
         if profile_id:
             return profile_id
         
-        xbmc.log(f"[HELPARR] Invalid {manager} profile setting, using default", xbmc.LOGWARNING)
-        return 1  # Default fallback
+        log.warning("Invalid %s profile setting, using default", manager)
+        return default_quality_profile(manager)
+
+def monitor_command_progress(manager, command_id, content_title, handed_off=False, search_name=""):
+    """Monitor the progress of a command and show progress dialog
 
-def monitor_command_progress(manager, command_id, content_title):
-    """Monitor the progress of a command and show progress dialog"""
-    xbmc.log(f"[HELPARR] Starting progress monitor for {manager} command {command_id}", xbmc.LOGINFO)
+    If the command was handed off to the background service the dialog only
+    follows the status the service publishes and leaves the notifications
+    to it.
+    """
+    log.debug("Starting progress monitor for %s command %s", manager, command_id)
     
     # Get progress monitoring interval from settings
     progress_interval = int(xbmcaddon.Addon().getSetting("progress_interval"))
-    xbmc.log(f"[HELPARR] Using progress monitoring interval: {progress_interval} seconds", xbmc.LOGINFO)
+    log.debug("Using progress monitoring interval: %s seconds", progress_interval)
     
     # Create progress dialog
     progress = xbmcgui.DialogProgress()
     progress.create("Searching for Content", f"Searching for '{content_title}'...")
     
+    # Learned duration of this kind of command drives polling and progress
+    estimate = estimate_duration(manager, search_name)
+    log.debug("Estimated duration of %s %s: %s", manager, search_name, estimate)
+    
     # Monitor progress
-    max_attempts = (5 * 60) // progress_interval  # Monitor for up to 5 minutes
+    started = time.time()
     attempt = 0
     minimized = False
     
-    while attempt < max_attempts:
+    while time.time() - started < COMMAND_TIMEOUT:  # Monitor for up to 5 minutes
         if progress.iscanceled() and not minimized:
             # Ask user if they want to continue in background
-            continue_background = xbmcgui.Dialog().yesno(
-                "Continue in background?", 
-                f"Search is still running for '{content_title}'.\n\nContinue monitoring in the background?"
-            )
+            with span("dialog", manager):
+                continue_background = xbmcgui.Dialog().yesno(
+                    "Continue in background?", 
+                    f"Search is still running for '{content_title}'.\n\nContinue monitoring in the background?"
+                )
             if continue_background:
                 minimized = True
                 progress.close()
-                xbmc.log("[HELPARR] User chose to continue monitoring in background", xbmc.LOGINFO)
+                log.debug("User chose to continue monitoring in background")
+                if handed_off:
+                    return  # The service keeps monitoring
             else:
                 progress.close()
-                xbmc.log("[HELPARR] User cancelled progress monitoring", xbmc.LOGINFO)
+                log.debug("User cancelled progress monitoring")
                 return
         
         # Get command status
-        status, response = arr_get(manager, f"command/{command_id}", "")
+        if handed_off:
+            command_data = get_command_status(manager, command_id)
+        else:
+            with span("poll", manager):
+                status, response = arr_get(manager, f"command/{command_id}", "")
+            command_data = response.json() if status and hasattr(response, 'json') else None
         
-        if status and hasattr(response, 'json'):
-            command_data = response.json()
+        if command_data is not None:
             command_status = command_data.get('status', 'unknown')
             command_name = command_data.get('commandName', 'Search')
             
-            xbmc.log(f"[HELPARR] Command {command_id} status: {command_status}", xbmc.LOGINFO)
+            log.debug("Command %s status: %s", command_id, command_status)
             
             if command_status == 'completed':
                 if not minimized:
                     progress.update(100, f"{command_name} completed for '{content_title}'!")
                     xbmc.sleep(1500)
                     progress.close()
+                if handed_off:
+                    return
                 
                 # Show notification
                 xbmcgui.Dialog().notification(
@@ -336,6 +320,10 @@ def monitor_command_progress(manager, command_id, content_title):
                     3000
                 )
                 
+                # Learn how long this kind of command takes
+                duration = parse_duration(command_data.get('duration')) or time.time() - started
+                record_duration(manager, command_data.get('name') or search_name, duration)
+                
                 # Check if content was found/downloaded
                 check_content_status(manager, content_title, command_data)
                 return
@@ -345,6 +333,8 @@ def monitor_command_progress(manager, command_id, content_title):
                     progress.update(100, f"{command_name} failed!")
                     xbmc.sleep(2000)
                     progress.close()
+                if handed_off:
+                    return
                 
                 xbmcgui.Dialog().notification(
                     "Helparr", 
@@ -356,11 +346,12 @@ def monitor_command_progress(manager, command_id, content_title):
                 
             elif command_status in ['queued', 'started']:
                 # Show progress
-                progress_percent = min(90, (attempt * 90) // max_attempts)  # Max 90% until completed
+                elapsed = time.time() - started
+                progress_percent = estimated_progress(elapsed, estimate, min(90, int(elapsed * 90) // COMMAND_TIMEOUT))  # Max 90% until completed
                 if not minimized:
                     progress.update(progress_percent, f"{command_name} in progress...")
             
-        elif not minimized:
+        elif not minimized and not handed_off:
             # API call failed
             progress.update(50, "Monitoring connection issues...")
         
@@ -368,12 +359,18 @@ def monitor_command_progress(manager, command_id, content_title):
         if not minimized and progress.iscanceled():
             continue  # Handle cancellation at top of loop
         
-        xbmc.sleep(progress_interval * 1000)  # Convert seconds to milliseconds
+        if handed_off:
+            delay = 1  # Reading the published status costs no request
+        else:
+            delay = next_poll_delay(time.time() - started, estimate, attempt, progress_interval)
+        xbmc.sleep(int(delay * 1000))  # Convert seconds to milliseconds
         attempt += 1
     
     # Timeout reached
     if not minimized:
         progress.close()
+    if handed_off:
+        return
     
     xbmcgui.Dialog().notification(
         "Helparr", 
@@ -382,86 +379,160 @@ def monitor_command_progress(manager, command_id, content_title):
         3000
     )
 
-def check_content_status(manager, content_title, command_data):
-    """Check if content was actually found and downloaded"""
-    # This could be expanded to check download queue, etc.
-    # For now, just show completion notification
-    xbmc.log(f"[HELPARR] Search completed for {content_title} in {manager}", xbmc.LOGINFO)
-    
-    # Could add logic here to:
-    # - Check if files were found
-    # - Monitor download progress
-    # - Show detailed results
-
-def arr_search_command(manager, content_type, content_id):
+def arr_search_command(manager, content_type, content_id, episode_scope=None, just_added=False):
     """
     Trigger search command for specific content in Radarr/Sonarr
+
+    For series an episode_scope of (season, episode or None) limits the
+    search to that episode or season, just_added is set when this call
+    added the series.
     """
-    xbmc.log(f"[HELPARR] arr_search_command called with manager={manager}, content_type={content_type}, content_id={content_id}", xbmc.LOGINFO)
+    log.debug("arr_search_command called with manager=%s, content_type=%s, content_id=%s, episode_scope=%s, just_added=%s", manager, content_type, content_id, episode_scope, just_added)
     
     # Ensure content_id is an integer
     try:
         content_id = int(content_id)
-        xbmc.log(f"[HELPARR] Converted content_id to integer: {content_id}", xbmc.LOGINFO)
+        log.debug("Converted content_id to integer: %s", content_id)
     except (ValueError, TypeError):
         error_msg = f"Invalid content_id: {content_id}"
-        xbmc.log(f"[HELPARR] Error: {error_msg}", xbmc.LOGERROR)
+        log.error("Error: %s", error_msg)
         return False, error_msg
     
-    if manager == "Radarr" and content_type == "movie":
-        command_name = "MoviesSearch"
-        data = {"name": command_name, "movieIds": [content_id]}
-        xbmc.log(f"[HELPARR] Radarr movie search command data: {data}", xbmc.LOGINFO)
-    elif manager == "Sonarr" and content_type == "series":
-        command_name = "SeriesSearch"
-        data = {"name": command_name, "seriesId": content_id}
-        xbmc.log(f"[HELPARR] Sonarr series search command data: {data}", xbmc.LOGINFO)
-    else:
-        error_msg = "Unsupported manager or content type"
-        xbmc.log(f"[HELPARR] Error: {error_msg}", xbmc.LOGERROR)
+    data, error_msg = build_search_command(manager, content_type, content_id, episode_scope, just_added)
+    if data is None:
+        log.error("Error: %s", error_msg)
         return False, error_msg
+    log.debug("%s search command data: %s", manager, log.Payload(data))
     
-    status, response = arr_post(manager, "command", data)
-    xbmc.log(f"[HELPARR] Search command result - status: {status}, response: {response}", xbmc.LOGINFO)
+    with span("search", manager):
+        status, response = arr_post(manager, "command", data)
+    log.debug("Search command result - status: %s, response: %s", status, log.Payload(response))
     return status, response
 
-def exit_success():
-    xbmcgui.Dialog().ok("Success", "Content added!")
-    xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
-
-def exit_success_with_search(manager, content_type, content_id, content_title):
-    """
-    Handle successful content addition with optional search functionality
-    """
-    xbmc.log(f"[HELPARR] exit_success_with_search called with manager={manager}, content_type={content_type}, content_id={content_id}, content_title={content_title}", xbmc.LOGINFO)
-    
+def get_search_mode():
+    """Get the search mode setting as Always, Ask or Never"""
     search_mode_index = xbmcaddon.Addon().getSetting("search_mode")
-    xbmc.log(f"[HELPARR] Search mode setting index: '{search_mode_index}'", xbmc.LOGINFO)
+    log.debug("Search mode setting index: '%s'", search_mode_index)
     
     # Convert index to actual mode (Kodi select settings return indices)
     search_modes = ["Always", "Ask", "Never"]
     try:
         search_mode = search_modes[int(search_mode_index)]
-        xbmc.log(f"[HELPARR] Converted search mode: '{search_mode}'", xbmc.LOGINFO)
+        log.debug("Converted search mode: '%s'", search_mode)
     except (ValueError, IndexError):
         search_mode = "Ask"  # Default fallback
-        xbmc.log(f"[HELPARR] Invalid search mode index, using default: '{search_mode}'", xbmc.LOGWARNING)
+        log.warning("Invalid search mode index, using default: '%s'", search_mode)
+    return search_mode
+
+def bulk_add_content(manager, id_list):
+    """Add a comma separated list of TMDB/TVDB IDs with one combined progress dialog"""
+    from resources.lib.bulk import parse_id_list, bulk_add, ADDED, EXISTS
+    
+    external_ids, invalid = parse_id_list(id_list)
+    log.debug("Bulk add of %s items to %s, invalid: %s", len(external_ids), manager, invalid)
+    if not external_ids:
+        exit_fail(f"No valid IDs in '{id_list}'")
+        return
+    
+    quality_profile_id = get_selected_quality_profile(manager)
+    # Let the server search for everything it adds in "Always" mode
+    search_mode = get_search_mode()
+    search_on_add = search_mode == "Always"
+    
+    progress = xbmcgui.DialogProgress()
+    progress.create(f"Adding to {manager}", f"Adding {len(external_ids)} items...")
+    try:
+        results = bulk_add(manager, external_ids, quality_profile_id, search_on_add,
+                           lambda done, total, message: progress.update(done * 100 // total, message))
+    finally:
+        progress.close()
+    
+    added = [result for result in results.values() if result[0] == ADDED]
+    if added:
+        invalidate_widgets(manager, ["upcoming"])
+    existing = [result for result in results.values() if result[0] == EXISTS]
+    summary = [f"Added: {len(added)}, already in {manager}: {len(existing)}, failed: {len(results) - len(added) - len(existing)}", ""]
+    for external_id in external_ids:
+        state, content_id, detail = results[external_id]
+        summary.append(f"[{state}] {external_id}: {detail}")
+    for entry in invalid:
+        summary.append(f"[invalid] {entry}")
+    xbmcgui.Dialog().textviewer(f"Helparr - {manager} bulk add", "\n".join(summary))
+    
+    # Search for everything that was newly added in as few commands as possible
+    content_ids = [result[1] for result in added if result[1]]
+    if not content_ids or search_mode == "Never":
+        return
+    if search_on_add:
+        xbmcgui.Dialog().notification("Helparr", f"Search started for {len(content_ids)} items", xbmcgui.NOTIFICATION_INFO, 2000)
+        return
+    # Only "Ask" is left, "Always" searched with the add requests
+    if xbmcgui.Dialog().yesno("Search for missing content", f"Start search for {len(content_ids)} added items?"):
+        if manager == "Radarr":
+            # MoviesSearch takes any number of movies
+            success, response = arr_post(manager, "command", {"name": "MoviesSearch", "movieIds": content_ids})
+        else:
+            for content_id in content_ids:
+                success, response = arr_search_command(manager, "series", content_id)
+        log.debug("Bulk search command result - status: %s, response: %s", success, log.Payload(response))
+        xbmcgui.Dialog().notification("Helparr", f"Search started for {len(content_ids)} items", xbmcgui.NOTIFICATION_INFO, 2000)
+
+def exit_success():
+    xbmcgui.Dialog().ok("Success", "Content added!")
+    xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
+
+def start_progress_monitor(target, args):
+    """Run a progress monitor without blocking the plugin"""
+    import threading
+    progress_thread = threading.Thread(target=target, args=args)
+    progress_thread.daemon = True
+    progress_thread.start()
+
+def monitor_added_search(manager, content_id, content_title):
+    """Monitor the search the server started on its own after adding content"""
+    command = wait_for_search_command(manager, content_id)
+    if command:
+        handed_off = hand_off_command(manager, command['id'], content_title, command.get('name', ""))
+        monitor_command_progress(manager, command['id'], content_title, handed_off, command.get('name', ""))
+
+def exit_success_with_search(manager, content_type, content_id, content_title, already_added=False, search_started=False, episode_scope=None):
+    """
+    Handle successful content addition with optional search functionality
+    """
+    log.debug("exit_success_with_search called with manager=%s, content_type=%s, content_id=%s, content_title=%s, search_started=%s", manager, content_type, content_id, content_title, search_started)
+    
+    if search_started:
+        # The add request already started the search, only follow it
+        start_progress_monitor(monitor_added_search, (manager, content_id, content_title))
+        xbmcgui.Dialog().notification(
+            "Helparr", 
+            f"Search started for '{content_title}'", 
+            xbmcgui.NOTIFICATION_INFO, 
+            2000
+        )
+        log.debug("Setting resolved URL")
+        xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
+        return
+    
+    search_mode = get_search_mode()
     
     should_search = False
     if search_mode == "Always":
         should_search = True
-        xbmc.log("[HELPARR] Search mode is Always - will search automatically", xbmc.LOGINFO)
+        log.debug("Search mode is Always - will search automatically")
     elif search_mode == "Ask":
-        xbmc.log("[HELPARR] Search mode is Ask - showing dialog", xbmc.LOGINFO)
-        should_search = xbmcgui.Dialog().yesno("Search for missing content", f"Content added successfully!\n\nStart search for '{content_title}'?")
-        xbmc.log(f"[HELPARR] User dialog response: {should_search}", xbmc.LOGINFO)
+        log.debug("Search mode is Ask - showing dialog")
+        added_msg = f"'{content_title}' is already in {manager}." if already_added else "Content added successfully!"
+        with span("dialog", manager):
+            should_search = xbmcgui.Dialog().yesno("Search for missing content", f"{added_msg}\n\nStart search for '{content_title}'?")
+        log.debug("User dialog response: %s", should_search)
     else:
-        xbmc.log(f"[HELPARR] Search mode is Never - skipping search", xbmc.LOGINFO)
+        log.debug("Search mode is Never - skipping search")
     # search_mode == "Never" - should_search remains False
     
     if should_search:
-        xbmc.log("[HELPARR] Starting search command", xbmc.LOGINFO)
-        success, response = arr_search_command(manager, content_type, content_id)
+        log.debug("Starting search command")
+        success, response = arr_search_command(manager, content_type, content_id, episode_scope, not already_added)
         if success:
             # Extract command ID for progress monitoring
             command_id = None
@@ -469,16 +540,14 @@ def exit_success_with_search(manager, content_type, content_id, content_title):
                 command_id = response.get('id')
             
             if command_id:
-                xbmc.log(f"[HELPARR] Search started with command ID: {command_id}", xbmc.LOGINFO)
+                log.debug("Search started with command ID: %s", command_id)
+                
+                # Let the background service follow the command if it runs
+                command_name = response.get('name', "")
+                handed_off = hand_off_command(manager, command_id, content_title, command_name)
                 
                 # Start progress monitoring in the background
-                import threading
-                progress_thread = threading.Thread(
-                    target=monitor_command_progress, 
-                    args=(manager, command_id, content_title)
-                )
-                progress_thread.daemon = True
-                progress_thread.start()
+                start_progress_monitor(monitor_command_progress, (manager, command_id, content_title, handed_off, command_name))
                 
                 # Show initial success message
                 xbmcgui.Dialog().notification(
@@ -489,116 +558,424 @@ def exit_success_with_search(manager, content_type, content_id, content_title):
                 )
             else:
                 success_msg = f"Content added and search started for '{content_title}'!"
-                xbmc.log(f"[HELPARR] Search successful: {success_msg}", xbmc.LOGINFO)
+                log.debug("Search successful: %s", success_msg)
                 xbmcgui.Dialog().ok("Search started", success_msg)
         else:
             error_msg = f"Content added successfully, but search failed:\n{response}"
-            xbmc.log(f"[HELPARR] Search failed: {response}", xbmc.LOGERROR)
+            log.error("Search failed: %s", log.Payload(response))
             xbmcgui.Dialog().ok("Search failed", error_msg)
     else:
-        xbmc.log("[HELPARR] Not searching - showing standard success dialog", xbmc.LOGINFO)
-        xbmcgui.Dialog().ok("Success", "Content added!")
+        log.debug("Not searching - showing standard success dialog")
+        xbmcgui.Dialog().ok("Success", f"Already in {manager}!" if already_added else "Content added!")
     
-    xbmc.log("[HELPARR] Setting resolved URL", xbmc.LOGINFO)
+    log.debug("Setting resolved URL")
     xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
 
+def export_stats_action():
+    """Write the latency summary as JSON to a folder the user picks"""
+    folder = xbmcgui.Dialog().browse(3, "Export statistics", "files")
+    if not folder:
+        return
+    path = os.path.join(folder, "helparr_stats.json")
+    with xbmcvfs.File(path, 'w') as f:
+        success = f.write(export_summary(summarize()))
+    if success:
+        xbmcgui.Dialog().notification("Helparr", f"Statistics exported to {path}", xbmcgui.NOTIFICATION_INFO, 3000)
+    else:
+        xbmcgui.Dialog().ok("Export failed", f"Could not write {path}")
+
+def dump_debug_log_action():
+    """Write the live service log and the debug logs saved after the last failures to a folder the user picks"""
+    dump_service_log()
+    buffers = log.saved_buffers()
+    if not buffers:
+        xbmcgui.Dialog().ok("Debug log", "No failure was recorded yet.\nEnable debug logging to see every step in kodi.log.")
+        return
+    folder = xbmcgui.Dialog().browse(3, "Save debug log", "files")
+    if not folder:
+        return
+    path = os.path.join(folder, "helparr_debug.log")
+    with xbmcvfs.File(path, 'w') as f:
+        success = f.write("\n".join(f"===== {role} =====\n{text}" for role, text in buffers.items()))
+    if success:
+        xbmcgui.Dialog().notification("Helparr", f"Debug log saved to {path}", xbmcgui.NOTIFICATION_INFO, 3000)
+    else:
+        xbmcgui.Dialog().ok("Saving failed", f"Could not write {path}")
+
+def search_action(manager, content_type, content_id, content_title):
+    """Search for an item selected in a browse list"""
+    success, response = arr_search_command(manager, content_type, content_id)
+    if not success or not isinstance(response, dict):
+        log.error("Search failed: %s", log.Payload(response))
+        xbmcgui.Dialog().ok("Search failed", f"Search failed for '{content_title}':\n{response}")
+        return
+    xbmcgui.Dialog().notification("Helparr", f"Search started for '{content_title}'", xbmcgui.NOTIFICATION_INFO, 2000)
+    command_name = response.get('name', "")
+    if response.get('id') and not hand_off_command(manager, response['id'], content_title, command_name):
+        monitor_command_progress(manager, response['id'], content_title, False, command_name)
+
+def browse_action(params):
+    """List the root menu or a page of a browse list"""
+    from resources.lib.browse import list_root, list_page
+    
+    if "browse" not in params:
+        if not list_root(PLUGIN_HANDLE, PLUGIN_URL):
+            # Nothing to browse before a server is set up
+            xbmcaddon.Addon().openSettings()
+        return
+    try:
+        page = max(1, int(params.get("page", 1)))
+    except ValueError:
+        page = 1
+    list_page(PLUGIN_HANDLE, PLUGIN_URL, params["browse"], params.get("manager"), page)
+
+def widget_action(params):
+    """List the widget feeds or one of them from the service's cache"""
+    from resources.lib.widgets import list_widgets, list_widget
+    
+    if "widget" not in params:
+        list_widgets(PLUGIN_HANDLE, PLUGIN_URL)
+        return
+    list_widget(PLUGIN_HANDLE, params["widget"], params.get("manager"))
+
 def exit_fail(error):
     ret = xbmcgui.Dialog().yesno("Fail", f"{error}\n\nOpen add-on settings?")
     if ret:
         xbmcaddon.Addon().openSettings()
 
+def run_single_flight(key, add_function, *args):
+    """Run an add request unless another invocation is already doing it
+
+    Duplicate invocations (double presses, players firing twice) only
+    resolve with the result of the one doing the work.
+    """
+    flight = SingleFlight(key)
+    result = flight.acquire_or_wait()
+    if result is not None:
+        log.debug("Attached to in-flight request %s, success: %s", key, result)
+        if result:
+            xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
+        return result
+    
+    success = False
+    try:
+        success = add_function(*args)
+    finally:
+        flight.release(success)
+    return success
+
+def choose_profiles(manager, instances):
+    """Let the user pick quality profiles of several instances, returns {instance: profile ID}
+
+    Each picked profile routes the add to the instance it belongs to, only
+    the first pick of an instance counts.
+    """
+    choices = [(instance, profile) for instance in instances for profile in load_cached_quality_profiles(instance)]
+    if not choices:
+        log.warning("No cached %s profiles to route by, using the first instance", manager)
+        return {instances[0]: None}
+    with span("dialog", manager):
+        selected = xbmcgui.Dialog().multiselect(f"Add to {manager} with profiles", [f"{profile['name']} ({instance_name(instance)})" for instance, profile in choices])
+    profiles = {}
+    for index in selected or []:
+        instance, profile = choices[index]
+        profiles.setdefault(instance, profile["id"])
+    log.debug("%s profiles picked: %s", manager, profiles)
+    return profiles
+
+def choose_instances(manager, external_id, genres=None):
+    """Get (instances, {instance: profile ID}) for an add, asking the user if the routing setting says so
+
+    The profiles are only set for instances the user picked a profile of,
+    the others use their quality profile setting.
+    """
+    from resources.lib.routing import route
+    
+    instances, choice = route(manager, genres, external_id)
+    if choice == "Profile":
+        profiles = choose_profiles(manager, instances)
+        return [instance for instance in instances if instance in profiles], profiles
+    if choice == "Ask":
+        with span("dialog", manager):
+            selected = xbmcgui.Dialog().multiselect(f"Add to {manager}", [instance_name(instance) for instance in instances], preselect=[0])
+        instances = [instances[index] for index in selected or []]
+    return instances, {}
+
+def add_to_instances(instances, external_id, episode_scope=None, profiles=None):
+    """Add an item to several instances at once with one combined result dialog
+
+    Profiles are picked first unless routing picked them already, then all
+    add requests go out concurrently.
+    Searches are started with their own commands afterwards, also
+    concurrently, so that the service can follow each of them.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from resources.lib.bulk import add_single, ADDED, EXISTS, FAILED
+    
+    targets = []
+    for instance in instances:
+        with span("profile", instance):
+            targets.append((instance, (profiles or {}).get(instance) or get_selected_quality_profile(instance)))
+    
+    def add(target):
+        instance, quality_profile_id = target
+        existing = library_check(instance, external_id)
+        if existing:
+            return EXISTS, existing[0], existing[1]
+        directory = choose_root_folder(instance)
+        if directory == "":
+            log.error("No %s root folder defined", instance)
+            return FAILED, None, "No root folder defined"
+        with span("add", instance):
+            return add_single(instance, external_id, quality_profile_id, directory, False, episode_scope)
+    
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        results = dict(zip([target[0] for target in targets], executor.map(add, targets)))
+    log.debug("Added %s to %s: %s", external_id, len(results), log.Payload(results))
+    
+    lines = []
+    for instance, (state, content_id, detail) in results.items():
+        lines.append(f"{instance_name(instance)}: " + {ADDED: "added", EXISTS: "already added"}.get(state, f"failed\n{detail}"))
+    found = [(instance, state, content_id, detail) for instance, (state, content_id, detail) in results.items() if state in (ADDED, EXISTS)]
+    for instance, (state, _, _) in results.items():
+        if state == ADDED:
+            invalidate_widgets(instance, ["upcoming"])
+    
+    search_mode = get_search_mode()
+    should_search = bool(found) and search_mode == "Always"
+    if found and search_mode == "Ask":
+        with span("dialog", manager_type(instances[0])):
+            should_search = xbmcgui.Dialog().yesno("Search for missing content", "\n".join(lines) + f"\n\nStart search on {len(found)} instances?")
+    else:
+        xbmcgui.Dialog().ok("Success" if found else "Failed", "\n".join(lines))
+    
+    if should_search:
+        content_type = "movie" if manager_type(instances[0]) == "Radarr" else "series"
+        
+        def search(item):
+            instance, state, content_id, content_title = item
+            success, response = arr_search_command(instance, content_type, content_id, episode_scope, state == ADDED)
+            if success and isinstance(response, dict) and response.get('id'):
+                hand_off_command(instance, response['id'], content_title, response.get('name', ""))
+            return success
+        
+        with ThreadPoolExecutor(max_workers=len(found)) as executor:
+            started = sum(executor.map(search, found))
+        xbmcgui.Dialog().notification("Helparr", f"Search started on {started} of {len(found)} instances", xbmcgui.NOTIFICATION_INFO, 2000)
+    
+    if found:
+        xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
+    return bool(found)
+
+def queue_add(manager, external_id, quality_profile_id, directory, episode_scope=None):
+    """Leave the add to the background service if asynchronous adds are enabled, returns True if queued
+
+    The search choice is made now since the service can't ask, the request
+    is journaled and replayed until the server accepts it.
+    """
+    if xbmcaddon.Addon().getSetting("async_adds") != "true" or not service_is_running():
+        return False
+    from resources.lib.journal import enqueue_add
+    
+    search_mode = get_search_mode()
+    search = search_mode == "Always"
+    if search_mode == "Ask":
+        with span("dialog", manager):
+            search = xbmcgui.Dialog().yesno("Search for missing content", "Start search for missing content once it is added?")
+    enqueue_add(manager, external_id, quality_profile_id, directory, search, episode_scope)
+    wake_journal()
+    
+    title = get_title(manager, external_id)
+    xbmcgui.Dialog().notification("Helparr", f"'{title}' queued for {manager}" if title else f"Queued for {manager}", xbmcgui.NOTIFICATION_INFO, 2000)
+    xbmcplugin.setResolvedUrl(PLUGIN_HANDLE, True, xbmcgui.ListItem(offscreen=True, path=PLUGIN_PATH+"resources/data/dummy.mp4"))
+    return True
+
+def add_movie(tmdb_id, manager="Radarr", quality_profile_id=None):
+    """Add a movie to a Radarr instance and continue with the search step, returns success"""
+    log.debug("TMDB ID: %s", tmdb_id)
+    # Items already in the library don't need the add round trip
+    with span("lookup", manager):
+        existing = library_check(manager, tmdb_id)
+    already_added = existing is not None
+    directory = ""
+    if not existing:
+        with span("rootfolder", manager):
+            directory = choose_root_folder(manager)
+        log.debug("%s directory: %s", manager, directory)
+    search_on_add = False
+    if existing:
+        success = True
+        response = {"id": existing[0], "title": existing[1]}
+    elif directory != "":
+        # Get selected quality profile
+        if not quality_profile_id:
+            with span("profile", manager):
+                quality_profile_id = get_selected_quality_profile(manager)
+        if queue_add(manager, tmdb_id, quality_profile_id, directory):
+            return True
+        # "Always" mode lets the server search right after adding
+        search_on_add = get_search_mode() == "Always"
+
+        data = build_add_payload(manager, tmdb_id, quality_profile_id, directory, search_on_add)
+        log.debug("%s POST data: %s", manager, log.Payload(data))
+        # Add to Radarr
+        with span("add", manager):
+            success, response = arr_post(manager, "movie", data)
+        log.debug("%s add result - success: %s", manager, success)
+        if success:
+            log.debug("%s response data: %s", manager, log.Payload(response))
+            if isinstance(response, dict):
+                library_add(manager, tmdb_id, response.get("id"), response.get("title"))
+                invalidate_widgets(manager, ["upcoming"])
+        elif is_already_added_error(response):
+            # Index was out of date, fetch the existing item instead
+            existing = library_fetch(manager, tmdb_id)
+            if existing:
+                success = already_added = True
+                response = {"id": existing[0], "title": existing[1]}
+    else:
+        response = "No root folder defined"
+        success = False
+        log.error("No %s root folder defined", manager)
+
+    if success:
+        log.debug("Movie added successfully, calling search function")
+        # Extract the internal ID and title from the response for search
+        if isinstance(response, dict):
+            content_id = response.get("id", tmdb_id)  # Use internal Radarr ID
+            content_title = response.get("title") or get_title(manager, tmdb_id) or f"Movie {tmdb_id}"  # Use actual title
+            log.debug("Extracted Radarr movie ID: %s, title: '%s'", content_id, content_title)
+        else:
+            content_id = tmdb_id  # Fallback
+            content_title = get_title(manager, tmdb_id) or f"Movie {tmdb_id}"
+            log.warning("Could not extract movie details from response, using fallback")
+        exit_success_with_search(manager, "movie", content_id, content_title, already_added, search_on_add and not already_added)
+    else:
+        log.error("Movie add failed: %s", log.Payload(response))
+        exit_fail(response)
+    
+    return success
+
+def add_tvshow(tvdb_id, episode_scope=None, manager="Sonarr", quality_profile_id=None):
+    """Add a TV show to a Sonarr instance and continue with the search step, returns success"""
+    log.debug("TVDB ID: %s, episode scope: %s", tvdb_id, episode_scope)
+    # Items already in the library don't need the add round trip
+    with span("lookup", manager):
+        existing = library_check(manager, tvdb_id)
+    already_added = existing is not None
+    directory = ""
+    if not existing:
+        with span("rootfolder", manager):
+            directory = choose_root_folder(manager)
+        log.debug("%s directory: %s", manager, directory)
+    search_on_add = False
+    if existing:
+        success = True
+        response = {"id": existing[0], "title": existing[1]}
+    elif directory != "":
+        # Get selected quality profile
+        if not quality_profile_id:
+            with span("profile", manager):
+                quality_profile_id = get_selected_quality_profile(manager)
+        if queue_add(manager, tvdb_id, quality_profile_id, directory, episode_scope):
+            return True
+        # "Always" mode lets the server search right after adding, unless
+        # only a single episode or season was requested
+        search_on_add = get_search_mode() == "Always" and episode_scope is None
+
+        data = build_add_payload(manager, tvdb_id, quality_profile_id, directory, search_on_add)
+        if episode_scope:
+            # Only monitor the requested season
+            data["seasons"] = season_monitoring(episode_scope[0], data.get("seasons"))
+        log.debug("%s POST data: %s", manager, log.Payload(data))
+        # Add to Sonarr
+        with span("add", manager):
+            success, response = arr_post(manager, "series", data)
+        log.debug("%s add result - success: %s", manager, success)
+        if success:
+            log.debug("%s response data: %s", manager, log.Payload(response))
+            if isinstance(response, dict):
+                library_add(manager, tvdb_id, response.get("id"), response.get("title"))
+                invalidate_widgets(manager, ["upcoming"])
+        elif is_already_added_error(response):
+            # Index was out of date, fetch the existing item instead
+            existing = library_fetch(manager, tvdb_id)
+            if existing:
+                success = already_added = True
+                response = {"id": existing[0], "title": existing[1]}
+    else:
+        response = "No root folder defined"
+        success = False
+        log.error("No %s root folder defined", manager)
+
+    if success:
+        log.debug("TV show added successfully, calling search function")
+        # Extract the internal ID and title from the response for search
+        if isinstance(response, dict):
+            content_id = response.get("id", tvdb_id)  # Use internal Sonarr ID
+            content_title = response.get("title") or get_title(manager, tvdb_id) or f"Series {tvdb_id}"  # Use actual title
+            log.debug("Extracted Sonarr series ID: %s, title: '%s'", content_id, content_title)
+        else:
+            content_id = tvdb_id  # Fallback
+            content_title = get_title(manager, tvdb_id) or f"Series {tvdb_id}"
+            log.warning("Could not extract series details from response, using fallback")
+        if episode_scope:
+            season, episode = episode_scope
+            content_title += f" S{season:02d}" + (f"E{episode:02d}" if episode is not None else "")
+        exit_success_with_search(manager, "series", content_id, content_title, already_added, search_on_add and not already_added, episode_scope)
+    else:
+        log.error("TV show add failed: %s", log.Payload(response))
+        exit_fail(response)
+    
+    return success
+
 if __name__ == "__main__":
-    xbmc.log("[HELPARR] Addon started", xbmc.LOGINFO)
-    xbmc.log(f"[HELPARR] Plugin params: {PLUGIN_PARAMS}", xbmc.LOGINFO)
+    log.debug("Addon started")
+    log.debug("Plugin params: %s", PLUGIN_PARAMS)
     
     # Check the parameters passed to the plugin
     if "movie" in PLUGIN_PARAMS:
-        xbmc.log("[HELPARR] Processing movie request", xbmc.LOGINFO)
+        log.debug("Processing movie request")
         tmdb_id = PLUGIN_PARAMS["movie"]
-        xbmc.log(f"[HELPARR] TMDB ID: {tmdb_id}", xbmc.LOGINFO)
-        directory = xbmcaddon.Addon().getSetting("radarr_dir")
-        xbmc.log(f"[HELPARR] Radarr directory: {directory}", xbmc.LOGINFO)
-        if directory != "":
-            # Get selected quality profile
-            quality_profile_id = get_selected_quality_profile("Radarr")
-            
-            data = {
-                    "title": "title",
-                    "qualityProfileId": quality_profile_id,
-                    "tmdbId": tmdb_id,
-                    "rootFolderPath": directory
-                }
-            xbmc.log(f"[HELPARR] Radarr POST data: {data}", xbmc.LOGINFO)
-            # Add to Radarr
-            success, response = arr_post("Radarr", "movie", data)
-            xbmc.log(f"[HELPARR] Radarr add result - success: {success}", xbmc.LOGINFO)
-            if success:
-                xbmc.log(f"[HELPARR] Radarr response data: {response}", xbmc.LOGINFO)
-        else:
-            response = "No root folder defined"
-            success = False
-            xbmc.log("[HELPARR] No Radarr root folder defined", xbmc.LOGERROR)
+        log.debug("TMDB ID: %s", tmdb_id)
+        instances, profiles = choose_instances("Radarr", tmdb_id, PLUGIN_PARAMS.get("genres"))
+        with span("invocation", "Radarr"):
+            if len(instances) == 1:
+                run_single_flight(f"{instances[0]}.{tmdb_id}", add_movie, tmdb_id, instances[0], profiles.get(instances[0]))
+            elif instances:
+                run_single_flight(f"Radarr.{tmdb_id}", add_to_instances, instances, tmdb_id, None, profiles)
         
-        if success:
-            xbmc.log("[HELPARR] Movie added successfully, calling search function", xbmc.LOGINFO)
-            # Extract the internal ID and title from the response for search
-            if isinstance(response, dict):
-                content_id = response.get("id", tmdb_id)  # Use internal Radarr ID
-                content_title = response.get("title", f"Movie {tmdb_id}")  # Use actual title
-                xbmc.log(f"[HELPARR] Extracted Radarr movie ID: {content_id}, title: '{content_title}'", xbmc.LOGINFO)
-            else:
-                content_id = tmdb_id  # Fallback
-                content_title = f"Movie {tmdb_id}"
-                xbmc.log("[HELPARR] Could not extract movie details from response, using fallback", xbmc.LOGWARNING)
-            exit_success_with_search("Radarr", "movie", content_id, content_title)
-        else:
-            xbmc.log(f"[HELPARR] Movie add failed: {response}", xbmc.LOGERROR)
-            exit_fail(response)
+        # Rebuild the library indexes after the user got feedback if they are too old
+        for instance in instances:
+            update_library_index(instance)
     elif "tvshow" in PLUGIN_PARAMS:
-        xbmc.log("[HELPARR] Processing TV show request", xbmc.LOGINFO)
+        log.debug("Processing TV show request")
         tvdb_id = PLUGIN_PARAMS["tvshow"]
-        xbmc.log(f"[HELPARR] TVDB ID: {tvdb_id}", xbmc.LOGINFO)
-        directory = xbmcaddon.Addon().getSetting("sonarr_dir")
-        xbmc.log(f"[HELPARR] Sonarr directory: {directory}", xbmc.LOGINFO)
-        if directory != "":
-            # Get selected quality profile
-            quality_profile_id = get_selected_quality_profile("Sonarr")
-            
-            data = {
-                    "title": "title",
-                    "qualityProfileId": quality_profile_id,
-                    "tvdbId": tvdb_id,
-                    "rootFolderPath": directory
-                }
-            xbmc.log(f"[HELPARR] Sonarr POST data: {data}", xbmc.LOGINFO)
-            # Add to Sonarr
-            success, response = arr_post("Sonarr", "series", data)
-            xbmc.log(f"[HELPARR] Sonarr add result - success: {success}", xbmc.LOGINFO)
-            if success:
-                xbmc.log(f"[HELPARR] Sonarr response data: {response}", xbmc.LOGINFO)
-        else:
-            response = "No root folder defined"
-            success = False
-            xbmc.log("[HELPARR] No Sonarr root folder defined", xbmc.LOGERROR)
+        episode_scope = parse_episode_scope(PLUGIN_PARAMS.get("season"), PLUGIN_PARAMS.get("episode"))
+        log.debug("TVDB ID: %s, episode scope: %s", tvdb_id, episode_scope)
+        instances, profiles = choose_instances("Sonarr", tvdb_id, PLUGIN_PARAMS.get("genres"))
+        with span("invocation", "Sonarr"):
+            if len(instances) == 1:
+                run_single_flight(f"{instances[0]}.{tvdb_id}", add_tvshow, tvdb_id, episode_scope, instances[0], profiles.get(instances[0]))
+            elif instances:
+                run_single_flight(f"Sonarr.{tvdb_id}", add_to_instances, instances, tvdb_id, episode_scope, profiles)
         
-        if success:
-            xbmc.log("[HELPARR] TV show added successfully, calling search function", xbmc.LOGINFO)
-            # Extract the internal ID and title from the response for search
-            if isinstance(response, dict):
-                content_id = response.get("id", tvdb_id)  # Use internal Sonarr ID
-                content_title = response.get("title", f"Series {tvdb_id}")  # Use actual title
-                xbmc.log(f"[HELPARR] Extracted Sonarr series ID: {content_id}, title: '{content_title}'", xbmc.LOGINFO)
-            else:
-                content_id = tvdb_id  # Fallback
-                content_title = f"Series {tvdb_id}"
-                xbmc.log("[HELPARR] Could not extract series details from response, using fallback", xbmc.LOGWARNING)
-            exit_success_with_search("Sonarr", "series", content_id, content_title)
-        else:
-            xbmc.log(f"[HELPARR] TV show add failed: {response}", xbmc.LOGERROR)
-            exit_fail(response)
+        # Rebuild the library indexes after the user got feedback if they are too old
+        for instance in instances:
+            update_library_index(instance)
+    elif "movies" in PLUGIN_PARAMS:
+        log.debug("Processing bulk movie request")
+        bulk_add_content("Radarr", PLUGIN_PARAMS["movies"])
+    elif "tvshows" in PLUGIN_PARAMS:
+        log.debug("Processing bulk TV show request")
+        bulk_add_content("Sonarr", PLUGIN_PARAMS["tvshows"])
+    elif "widget" in PLUGIN_PARAMS or "widgets" in PLUGIN_PARAMS:
+        widget_action(PLUGIN_PARAMS)
+    elif "browse" in PLUGIN_PARAMS or not PLUGIN_PARAMS:
+        browse_action(PLUGIN_PARAMS)
     elif "action" in PLUGIN_PARAMS:
         action = PLUGIN_PARAMS["action"]
-        xbmc.log(f"[HELPARR] Processing action: {action}", xbmc.LOGINFO)
+        log.debug("Processing action: %s", action)
         
         if action == "AddToTmdbh":
             # First check if TheMovieDB Helper is installed
@@ -614,19 +991,27 @@ if __name__ == "__main__":
             else:
                 xbmcgui.Dialog().ok("Failed", "Something went wrong, is TheMovieDb Helper installed?")
         elif action == "RefreshRadarrProfiles":
-            success = refresh_quality_profiles("Radarr")
-            if success:
-                # Update settings dropdown
-                update_quality_profile_settings("Radarr")
-            else:
-                xbmcgui.Dialog().ok("Error", "Failed to refresh Radarr quality profiles.\nCheck your Radarr connection settings.")
+            refresh_profiles_action("Radarr")
         elif action == "RefreshSonarrProfiles":
-            success = refresh_quality_profiles("Sonarr")
-            if success:
-                # Update settings dropdown
-                update_quality_profile_settings("Sonarr")
-            else:
-                xbmcgui.Dialog().ok("Error", "Failed to refresh Sonarr quality profiles.\nCheck your Sonarr connection settings.")
+            refresh_profiles_action("Sonarr")
+        elif action == "RefreshProfiles" and PLUGIN_PARAMS.get("manager") in INSTANCES:
+            refresh_profiles_action(PLUGIN_PARAMS["manager"])
+        elif action == "SyncAll":
+            sync_all_action()
+        elif action == "ShowStats":
+            xbmcgui.Dialog().textviewer("Helparr statistics", format_summary(summarize()))
+        elif action == "ExportStats":
+            export_stats_action()
+        elif action == "DumpDebugLog":
+            dump_debug_log_action()
+        elif action == "Search":
+            search_action(PLUGIN_PARAMS.get("manager"), PLUGIN_PARAMS.get("type"), PLUGIN_PARAMS.get("id"), PLUGIN_PARAMS.get("title", "content"))
+        elif action == "OpenSettings":
+            xbmcaddon.Addon().openSettings()
     else:
         # No supported parameter was found, just open the settings
         xbmcaddon.Addon().openSettings()
+    
+    # Keep the whole story of a failed invocation for DumpDebugLog
+    log.flush()
+    flush_metrics()
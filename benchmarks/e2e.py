@@ -0,0 +1,179 @@
+"""End-to-end benchmark of plugin invocations against fake Radarr/Sonarr servers
+
+Every invocation runs addon.py through its real __main__ dispatch in a new
+Python process, like Kodi does, with the stub modules in kodistubs/ and
+the servers from fakearr.py running in this process.
+
+    python benchmarks/e2e.py [--runs 20] [--concurrency 1] [--latency-ms 20] [--error-rate 0] [--library 5000]
+
+The "push monitor" scenario runs the background service instead, hands it
+a search and fails unless the completion arrives over the SignalR hub.
+
+Reports invocation latency percentiles, requests per invocation and peak
+RSS of each scenario. With --concurrency that many invocations run at once,
+e.g. a skin refreshing several widgets. Fails when a scenario's p95 exceeds
+--max-p95-ms or an invocation fails.
+"""
+import argparse, itertools, json, os, shutil, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakearr import FakeArr, start
+from startup import ADDON_PATH, BENCHMARK_PATH, peak_rss_kb, run_child
+
+# Plugin parameters, with {n} replaced by a new external ID per invocation,
+# and the settings of each scenario. Profiles are picked in a select dialog
+# and the search mode index is 0 Always, 1 Ask, 2 Never. Parameters starting
+# with SERVICE run the background service with a search of that movie ID.
+SERVICE = "service:"
+SCENARIOS = {
+    "movie add": ("?movie={n}", {"search_mode": "2"}),
+    "tvshow add": ("?tvshow={n}", {"search_mode": "2"}),
+    "profile refresh": ("?action=RefreshRadarrProfiles", {}),
+    "search monitor": ("?movie={n}", {"search_mode": "0", "progress_interval": "3"}),
+    "push monitor": (SERVICE + "{n}", {"push_updates": "true", "progress_interval": "3"}),
+}
+# Longest a service run may take to see its search complete (seconds)
+SERVICE_TIMEOUT = 30
+# Percentiles of the report
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of sorted samples"""
+    index = max(0, -(-len(samples) * percent // 100) - 1)
+    return samples[min(index, len(samples) - 1)]
+
+def invoke(params, env):
+    """Run one invocation in a child process, returns its measurement"""
+    started = time.perf_counter()
+    child = ["--service-child", params[len(SERVICE):]] if params.startswith(SERVICE) else ["--child", params]
+    result = subprocess.run([sys.executable, __file__] + child, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        return {"ms": (time.perf_counter() - started) * 1000, "rss_kb": None, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_service_child(movie_id):
+    """Run the background service until a search it was handed completes, print the measurement as JSON
+
+    Commands are followed by push, polls only happen until the hub stream
+    is up, so a completion that didn't arrive over the hub is an error.
+    """
+    sys.path[:0] = [os.path.join(BENCHMARK_PATH, "kodistubs"), ADDON_PATH]
+    from resources.lib.api import arr_post
+    from resources.lib.monitor import CommandScheduler
+
+    scheduler = CommandScheduler()
+    pushed = []
+    on_command = scheduler.on_command
+
+    def on_push(manager, command_data):
+        pushed.append(command_data.get("status"))
+        on_command(manager, command_data)
+
+    scheduler.on_command = on_push
+    started = time.perf_counter()
+    success, response = arr_post("Radarr", "command", {"name": "MoviesSearch", "movieIds": [int(movie_id)]})
+    if not success:
+        print(json.dumps({"ms": 0, "rss_kb": None, "error": [f"Search failed: {response}"]}))
+        return
+    scheduler.register_command("Radarr", response["id"], f"Movie {movie_id}", response["name"])
+    scheduler.abortRequested = lambda: not scheduler.commands or time.perf_counter() - started > SERVICE_TIMEOUT
+    scheduler.run()
+    elapsed = time.perf_counter() - started
+
+    result = {"ms": elapsed * 1000, "rss_kb": peak_rss_kb()}
+    if scheduler.commands:
+        result["error"] = ["Search not completed"]
+    elif "completed" not in pushed:
+        result["error"] = ["Completion not pushed"]
+    print(json.dumps(result))
+
+def scenario_env(name, env, base_settings):
+    """Get the parameters and the environment with the settings of a scenario"""
+    params, settings = SCENARIOS[name]
+    return params, dict(env, HELPARR_STUB_SETTINGS=json.dumps(dict(base_settings, **settings)))
+
+def run_scenario(name, servers, runs, concurrency, env, base_settings, ids):
+    params, env = scenario_env(name, env, base_settings)
+    for arr in servers:
+        arr.reset()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda n: invoke(params.format(n=n), env), [next(ids) for _ in range(runs)]))
+        wall = time.perf_counter() - started
+    requests = sum(sum(arr.counts().values()) for arr in servers)
+    samples = sorted(result["ms"] for result in results)
+    rss = [result["rss_kb"] for result in results if result.get("rss_kb")]
+    return {
+        "scenario": name,
+        "runs": runs,
+        "failed": sum(1 for result in results if "error" in result),
+        "errors": sorted({line for result in results for line in result.get("error", [])}),
+        **{f"p{percent}": percentile(samples, percent) for percent in PERCENTILES},
+        "max": samples[-1],
+        "requests": requests / runs,
+        "rss_mb": max(rss) / 1024 if rss else None,
+        "throughput": runs / wall
+    }
+
+def print_report(report):
+    print(f"{'scenario':<18}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'req/inv':>9}{'rss':>9}{'inv/s':>8}  failed")
+    for entry in report:
+        rss = f"{entry['rss_mb']:.0f}MB" if entry["rss_mb"] else "-"
+        print(f"{entry['scenario']:<18}" + "".join(f"{entry[f'p{percent}']:>7.0f}ms" for percent in PERCENTILES)
+              + f"{entry['max']:>7.0f}ms{entry['requests']:>9.1f}{rss:>9}{entry['throughput']:>8.1f}  {entry['failed']}")
+        for error in entry["errors"]:
+            print(f"    {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="invocations per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="invocations running at once")
+    parser.add_argument("--latency-ms", type=float, default=20, help="delay of every server response")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests failing with 503")
+    parser.add_argument("--library", type=int, default=5000, help="items in each server's library")
+    parser.add_argument("--command-seconds", type=float, default=2, help="time until search commands complete")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these scenarios")
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="fail if a scenario's p95 exceeds this")
+    parser.add_argument("--json", metavar="FILE", help="also write the report to FILE")
+    parser.add_argument("--child", metavar="PARAMS", help=argparse.SUPPRESS)
+    parser.add_argument("--service-child", metavar="ID", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, wait=True)
+        return 0
+    if args.service_child is not None:
+        run_service_child(args.service_child)
+        return 0
+
+    servers = [FakeArr(manager, args.library, args.latency_ms / 1000, args.error_rate, args.command_seconds) for manager in ("Radarr", "Sonarr")]
+    (radarr_server, radarr_url), (sonarr_server, sonarr_url) = [start(arr) for arr in servers]
+    # New external IDs, the fake libraries use 1000001 and up
+    ids = itertools.count(1)
+
+    with tempfile.TemporaryDirectory() as userdata, tempfile.TemporaryDirectory() as addon_path:
+        # Profile refreshes rewrite the settings, keep them away from the checkout
+        shutil.copytree(os.path.join(ADDON_PATH, "resources"), os.path.join(addon_path, "resources"))
+        env = dict(os.environ, HELPARR_USERDATA=userdata, HELPARR_STUB_ADDON_PATH=addon_path)
+        base_settings = {"radarr_addr": radarr_url, "radarr_api": "benchmark", "radarr_dir": "/media/movies",
+                         "sonarr_addr": sonarr_url, "sonarr_api": "benchmark", "sonarr_dir": "/media/tv"}
+
+        # Warm up the caches like a device that has been in use
+        invoke(*scenario_env("profile refresh", env, base_settings))
+        report = [run_scenario(name, servers, args.runs, args.concurrency, env, base_settings, ids) for name in args.scenario or SCENARIOS]
+
+    radarr_server.shutdown()
+    sonarr_server.shutdown()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": {key: value for key, value in vars(args).items() if key not in ("child", "service_child", "json")}, "scenarios": report}, f, indent=2)
+    failed = any(entry["failed"] for entry in report)
+    if args.max_p95_ms:
+        failed = failed or any(entry["p95"] > args.max_p95_ms for entry in report)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Fake Radarr/Sonarr server for the benchmarks
+
+Serves the parts of the v3 API the add-on uses from memory, with knobs for
+latency, failing requests and library size:
+
+    python benchmarks/fakearr.py [--port 7878] [--latency-ms 50] [--error-rate 0.1] [--library 20000]
+
+Every request is counted per method and path, see FakeArr.counts(). The
+SignalR hub at /signalr/messages pushes command updates over Server-Sent
+Events like the real servers do.
+"""
+import argparse, json, queue, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = "/api/v3/"
+QUALITY_PROFILES = [{"id": 1, "name": "Any"}, {"id": 4, "name": "HD-1080p"}, {"id": 5, "name": "Ultra-HD"}]
+HUB_PATH = "/signalr/messages"
+# Seconds between pings on idle hub streams, like the real servers
+HUB_PING_INTERVAL = 15
+ROOT_FOLDERS = [{"id": 1, "path": "/media/movies", "freeSpace": 2 * 1024 ** 4}, {"id": 2, "path": "/media/movies2", "freeSpace": 5 * 1024 ** 4}]
+
+
+class FakeArr:
+    """State of one fake server, movies for Radarr or series for Sonarr
+
+    latency is added to every response, error_rate is the fraction of
+    requests answered with 503 and commands complete command_seconds after
+    they were started.
+    """
+
+    def __init__(self, manager="Radarr", library=100, latency=0.0, error_rate=0.0, command_seconds=2.0, seed=0):
+        self.manager = manager
+        self.latency = latency
+        self.error_rate = error_rate
+        self.command_seconds = command_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.commands = {}
+        self.next_id = library + 1
+        self.external_field, self.collection = ("tmdbId", "movie") if manager == "Radarr" else ("tvdbId", "series")
+        self.items = {index: {"id": index, self.external_field: 1000000 + index, "title": f"{manager} item {index}", "year": 2000 + index % 25,
+                              "monitored": True, "images": [{"coverType": "poster", "remoteUrl": f"https://image.example/{index}.jpg"}]}
+                      for index in range(1, library + 1)}
+        # (items, body) of the last whole library response, encoding it dominates
+        self.library_body = None
+        # Message queues of the open hub streams
+        self.subscribers = []
+
+    def count(self, method, path):
+        with self.lock:
+            key = f"{method} {path}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def counts(self):
+        """Get {"METHOD path": requests} since the start or the last reset"""
+        with self.lock:
+            return dict(self.requests)
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+
+    def command_status(self, command):
+        if time.time() - command["started"] >= self.command_seconds:
+            command["status"] = "completed"
+            command["duration"] = time.strftime("%H:%M:%S", time.gmtime(self.command_seconds)) + ".0000000"
+        elif command["status"] == "queued":
+            command["status"] = "started"
+        return {key: value for key, value in command.items() if key != "started"}
+
+    def add_command(self, name, body):
+        with self.lock:
+            command = {"id": self.next_id, "name": name, "commandName": name, "status": "queued", "body": body, "started": time.time()}
+            self.next_id += 1
+            self.commands[command["id"]] = command
+        timer = threading.Timer(self.command_seconds, self.push_command, [command])
+        timer.daemon = True
+        timer.start()
+        return self.command_status(command)
+
+    def subscribe(self):
+        events = queue.Queue()
+        with self.lock:
+            self.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.remove(events)
+
+    def publish(self, message):
+        """Send a SignalR message to all hub streams, None is the handshake response"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            events.put(message)
+
+    def push_command(self, command):
+        # Timers may fire a moment before the wall clock says the command is done
+        command["started"] = min(command["started"], time.time() - self.command_seconds)
+        self.publish({"type": 1, "target": "receiveMessage",
+                      "arguments": [{"name": "command", "body": {"action": "updated", "resource": self.command_status(command)}}]})
+
+    def lookup(self, external_id):
+        """Metadata of an external ID like the lookup endpoints return it"""
+        item = {"title": f"{self.manager} title {external_id}", "sortTitle": f"{self.manager.lower()} title {external_id}", "year": 2000 + external_id % 25,
+                "titleSlug": f"{self.manager.lower()}-title-{external_id}", self.external_field: external_id,
+                "genres": ["Animation"] if external_id % 2 else ["Drama"],
+                "images": [{"coverType": "poster", "remoteUrl": f"https://image.example/lookup/{external_id}.jpg"}]}
+        if self.manager == "Sonarr":
+            item["seasons"] = [{"seasonNumber": season, "monitored": False} for season in range(3)]
+        return item
+
+    def get(self, path, query):
+        """Answer a GET, returns (status code, body)"""
+        if path == "qualityprofile":
+            return 200, QUALITY_PROFILES
+        if path == "rootfolder":
+            return 200, ROOT_FOLDERS
+        if path in ("tag", "languageprofile", "queue/details", "calendar"):
+            return 200, []
+        if path == "system/status":
+            return 200, {"appName": self.manager, "version": "5.0.0"}
+        if path == self.collection:
+            if self.external_field in query:
+                external_id = int(query[self.external_field][0])
+                return 200, [item for item in self.items.values() if item[self.external_field] == external_id]
+            if self.library_body is None or self.library_body[0] != len(self.items):
+                self.library_body = (len(self.items), json.dumps(list(self.items.values())).encode())
+            return 200, self.library_body[1]
+        if path == "movie/lookup/tmdb" and self.manager == "Radarr":
+            return 200, self.lookup(int(query.get("tmdbId", ["0"])[0]))
+        if path == "series/lookup" and self.manager == "Sonarr":
+            term = query.get("term", [""])[0]
+            return 200, [self.lookup(int(term[5:]))] if term.startswith("tvdb:") and term[5:].isdigit() else []
+        if path.startswith(self.collection + "/") and path[len(self.collection) + 1:].isdigit():
+            item = self.items.get(int(path[len(self.collection) + 1:]))
+            return (200, item) if item else (404, {"message": "NotFound"})
+        if path == "episode":
+            series_id = int(query.get("seriesId", ["0"])[0])
+            return 200, [{"id": series_id * 1000 + season * 100 + episode, "seriesId": series_id, "seasonNumber": season, "episodeNumber": episode}
+                         for season in (1, 2) for episode in range(1, 11)]
+        if path == "command":
+            return 200, [self.command_status(command) for command in list(self.commands.values())]
+        if path.startswith("command/"):
+            command = self.commands.get(int(path.split("/")[1]))
+            return (200, self.command_status(command)) if command else (404, {"message": "NotFound"})
+        if path in ("history", "queue", "wanted/missing"):
+            return 200, {"page": int(query.get("page", ["1"])[0]), "pageSize": int(query.get("pageSize", ["10"])[0]), "totalRecords": 0, "records": []}
+        return 404, {"message": "NotFound"}
+
+    def post(self, path, data):
+        """Answer a POST, returns (status code, body)"""
+        if path == self.collection:
+            external_id = int(data.get(self.external_field, 0))
+            with self.lock:
+                if any(item[self.external_field] == external_id for item in self.items.values()):
+                    return 400, [{"propertyName": self.external_field, "errorMessage": f"This {self.collection} has already been added", "severity": "error"}]
+                item = {"id": self.next_id, self.external_field: external_id, "title": data.get("title") or f"{self.manager} item {external_id}", "monitored": True}
+                self.next_id += 1
+                self.items[item["id"]] = item
+            options = data.get("addOptions") or {}
+            if options.get("searchForMovie"):
+                self.add_command("MoviesSearch", {"movieIds": [item["id"]]})
+            elif options.get("searchForMissingEpisodes"):
+                self.add_command("MissingEpisodeSearch", {"seriesId": item["id"], "monitored": True})
+            return 201, item
+        if path == "command":
+            body = {key: value for key, value in data.items() if key != "name"}
+            return 201, self.add_command(data.get("name", "Unknown"), body)
+        return 404, {"message": "NotFound"}
+
+def make_handler(arr):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def respond(self, status, body):
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def stream(self):
+            """Serve a hub stream until the client goes away"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            events = arr.subscribe()
+            try:
+                while True:
+                    try:
+                        message = events.get(timeout=HUB_PING_INTERVAL)
+                    except queue.Empty:
+                        message = {"type": 6}
+                    payload = "{}" if message is None else json.dumps(message)
+                    self.wfile.write(f"data: {payload}\x1e\n\n".encode())
+                    self.wfile.flush()
+            except OSError:
+                pass
+            finally:
+                arr.unsubscribe(events)
+
+        def hub(self, method, path):
+            if method == "GET":
+                return self.stream()
+            if path.endswith("/negotiate"):
+                return self.respond(200, {"negotiateVersion": 1, "connectionId": "benchmark", "connectionToken": "benchmark",
+                                          "availableTransports": [{"transport": "ServerSentEvents", "transferFormats": ["Text"]}]})
+            # Handshake, answered on the stream
+            arr.publish(None)
+            return self.respond(200, b"")
+
+        def handle_request(self, method):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+            arr.count(method, path)
+            if arr.latency:
+                time.sleep(arr.latency)
+            if path.startswith(HUB_PATH):
+                return self.hub(method, path)
+            if arr.error_rate and arr.random.random() < arr.error_rate:
+                return self.respond(503, {"message": "Service Unavailable"})
+            if method == "GET":
+                return self.respond(*arr.get(path, parse_qs(url.query)))
+            try:
+                data = json.loads(raw or b"{}")
+            except ValueError:
+                return self.respond(400, {"message": "Invalid JSON"})
+            return self.respond(*arr.post(path, data))
+
+        def do_GET(self):
+            self.handle_request("GET")
+
+        def do_POST(self):
+            self.handle_request("POST")
+
+    return Handler
+
+def start(arr, port=0):
+    """Serve a FakeArr in a background thread, returns (server, URL)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(arr))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"fakearr_{arr.manager}", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manager", choices=("Radarr", "Sonarr"), default="Radarr")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--library", type=int, default=100, help="items in the library")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay of every response")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests failing with 503")
+    parser.add_argument("--command-seconds", type=float, default=2, help="time until commands complete")
+    args = parser.parse_args()
+
+    arr = FakeArr(args.manager, args.library, args.latency_ms / 1000, args.error_rate, args.command_seconds)
+    server, url = start(arr, args.port)
+    print(f"Fake {args.manager} with {args.library} items at {url}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Minimal stand-in for Kodi's xbmc module"""
+import os, time
+
+LOGDEBUG, LOGINFO, LOGWARNING, LOGERROR, LOGFATAL = 0, 1, 2, 3, 4
+
+def log(msg, level=LOGINFO):
+    if os.environ.get("HELPARR_STUB_LOG"):
+        print(msg)
+
+def sleep(milliseconds):
+    time.sleep(milliseconds / 1000)
+
+def executebuiltin(function, wait=False):
+    pass
+
+def executeJSONRPC(request):
+    return '{"jsonrpc": "2.0", "id": 1, "result": "OK"}'
+
+def getCondVisibility(condition):
+    return False
+
+def getInfoLabel(label):
+    return ""
+
+class Monitor:
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        time.sleep(timeout)
+        return False
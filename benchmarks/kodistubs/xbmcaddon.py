@@ -0,0 +1,38 @@
+"""Minimal stand-in for Kodi's xbmcaddon module
+
+Settings start out as the defaults from resources/settings.xml and can be
+overridden through SETTINGS or, for child processes, a JSON object in the
+HELPARR_STUB_SETTINGS environment variable. HELPARR_STUB_ADDON_PATH moves
+the add-on path, so that e.g. profile refreshes don't rewrite the real
+resources/settings.xml.
+"""
+import json, os, re
+
+ADDON_PATH = os.environ.get("HELPARR_STUB_ADDON_PATH") or os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SETTINGS = {}
+
+def _load_defaults():
+    with open(os.path.join(ADDON_PATH, "resources", "settings.xml"), encoding="utf-8") as f:
+        return dict(re.findall(r'id="([^"]+)"\s+default="([^"]*)"', f.read()))
+
+SETTINGS.update(_load_defaults())
+SETTINGS.update(json.loads(os.environ.get("HELPARR_STUB_SETTINGS") or "{}"))
+
+class Addon:
+    def __init__(self, id=None):
+        pass
+
+    def getSetting(self, setting_id):
+        return SETTINGS.get(setting_id, "")
+
+    def setSetting(self, setting_id, value):
+        SETTINGS[setting_id] = value
+
+    def getAddonInfo(self, info):
+        return {"id": "plugin.module.helparr", "path": ADDON_PATH, "version": "0.0.0"}.get(info, "")
+
+    def getLocalizedString(self, string_id):
+        return str(string_id)
+
+    def openSettings(self):
+        pass
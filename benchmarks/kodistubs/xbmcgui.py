@@ -0,0 +1,82 @@
+"""Minimal stand-in for Kodi's xbmcgui module
+
+Dialogs answer with defaults unless ANSWERS or, for child processes, a JSON
+object in the HELPARR_STUB_DIALOGS environment variable says otherwise,
+e.g. {"yesno": false, "select": 1}. Every dialog shown is added to SHOWN.
+"""
+import json, os
+
+NOTIFICATION_INFO, NOTIFICATION_WARNING, NOTIFICATION_ERROR = "info", "warning", "error"
+
+ANSWERS = json.loads(os.environ.get("HELPARR_STUB_DIALOGS") or "{}")
+SHOWN = []
+
+_properties = {}
+
+class Window:
+    def __init__(self, window_id):
+        pass
+
+    def getProperty(self, key):
+        return _properties.get(key, "")
+
+    def setProperty(self, key, value):
+        _properties[key] = value
+
+    def clearProperty(self, key):
+        _properties.pop(key, None)
+
+def _answer(dialog, heading, default):
+    SHOWN.append((dialog, heading))
+    return ANSWERS.get(dialog, default)
+
+class Dialog:
+    def ok(self, heading, message):
+        return _answer("ok", heading, True)
+
+    def yesno(self, heading, message, *args, **kwargs):
+        return _answer("yesno", heading, True)
+
+    def select(self, heading, options, *args, **kwargs):
+        return _answer("select", heading, 0)
+
+    def multiselect(self, heading, options, *args, **kwargs):
+        return _answer("multiselect", heading, [0])
+
+    def input(self, heading, default="", *args, **kwargs):
+        return _answer("input", heading, default)
+
+    def notification(self, heading, message, *args, **kwargs):
+        _answer("notification", message, None)
+
+    def textviewer(self, heading, text, *args, **kwargs):
+        _answer("textviewer", heading, None)
+
+    def browse(self, type, heading, shares, *args, **kwargs):
+        return _answer("browse", heading, "")
+
+class DialogProgress:
+    def create(self, heading, message=""):
+        pass
+
+    def update(self, percent, message=""):
+        pass
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
+
+class DialogProgressBG(DialogProgress):
+    def isFinished(self):
+        return False
+
+class ListItem:
+    def __init__(self, label="", label2="", path="", offscreen=False):
+        self.label = label
+        self.path = path
+
+    def __getattr__(self, name):
+        # setArt, setInfo, setProperty, getVideoInfoTag, ...
+        return lambda *args, **kwargs: self
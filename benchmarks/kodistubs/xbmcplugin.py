@@ -0,0 +1,19 @@
+"""Minimal stand-in for Kodi's xbmcplugin module"""
+
+def setResolvedUrl(handle, succeeded, listitem):
+    pass
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    return True
+
+def addDirectoryItems(handle, items, totalItems=0):
+    return True
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
+
+def setContent(handle, content):
+    pass
+
+def setPluginCategory(handle, category):
+    pass
@@ -0,0 +1,38 @@
+"""Minimal stand-in for Kodi's xbmcvfs module, special:// paths map to HELPARR_USERDATA"""
+import os, shutil, tempfile
+
+USERDATA = os.environ.get("HELPARR_USERDATA") or os.path.join(tempfile.gettempdir(), "helparr-userdata")
+
+def translatePath(path):
+    return path.replace("special://userdata/", USERDATA.rstrip("/") + "/").replace("special://profile/", USERDATA.rstrip("/") + "/")
+
+def exists(path):
+    return os.path.exists(translatePath(path))
+
+def mkdirs(path):
+    os.makedirs(translatePath(path), exist_ok=True)
+    return True
+
+def copy(source, destination):
+    shutil.copy(translatePath(source), translatePath(destination))
+    return True
+
+class File:
+    def __init__(self, path, mode="r"):
+        self.file = open(translatePath(path), mode.replace("b", "") or "r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self):
+        return self.file.read()
+
+    def write(self, data):
+        self.file.write(data)
+        return True
+
+    def close(self):
+        self.file.close()
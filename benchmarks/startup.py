@@ -0,0 +1,91 @@
+"""Cold start benchmark of the plugin entry point
+
+Kodi starts a fresh interpreter for every plugin call, so every sample
+runs addon.py in a new Python process against the stub xbmc modules in
+kodistubs/. Only routes that don't need a Radarr/Sonarr server are timed.
+
+    python benchmarks/startup.py [--runs 20] [--max-ms 150]
+
+Fails when a route imports one of HEAVY_MODULES or when its median exceeds
+--max-ms, so import time regressions show up before they reach a device.
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile, threading, time
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+ADDON_PATH = os.path.dirname(BENCHMARK_PATH)
+# Plugin parameters of the timed routes
+ROUTES = {
+    "open settings": "?action=OpenSettings",
+    "root menu": "",
+    "add to tmdbh": "?action=AddToTmdbh",
+    "widget": "?widget=upcoming&manager=Radarr",
+}
+# Modules no route without network access should load
+HEAVY_MODULES = ("requests", "urllib3", "http.client", "concurrent.futures")
+
+
+def peak_rss_kb():
+    """Peak resident memory of this process in KB, None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KB everywhere else
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def run_child(params, wait=False):
+    """Run addon.py once in this process and print the measurement as JSON
+
+    With wait the threads the invocation left running, e.g. a progress
+    monitor, are waited for as well, like Kodi waits for them.
+    """
+    sys.path[:0] = [os.path.join(BENCHMARK_PATH, "kodistubs"), ADDON_PATH]
+    sys.argv = ["plugin://plugin.module.helparr/", "1", params]
+    started = time.perf_counter()
+    import runpy
+    runpy.run_path(os.path.join(ADDON_PATH, "addon.py"), run_name="__main__")
+    if wait:
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not thread.name.startswith("fakearr"):
+                thread.join(600)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"ms": elapsed * 1000, "heavy": [module for module in HEAVY_MODULES if module in sys.modules], "rss_kb": peak_rss_kb()}))
+
+def measure(params, runs, env):
+    samples, heavy = [], set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, __file__, "--child", params], env=env, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["ms"])
+        heavy.update(result["heavy"])
+    return samples, sorted(heavy)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="samples per route")
+    parser.add_argument("--max-ms", type=float, default=0, help="fail if a route's median exceeds this")
+    parser.add_argument("--child", metavar="PARAMS", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child)
+        return 0
+
+    failed = False
+    with tempfile.TemporaryDirectory() as userdata:
+        env = dict(os.environ, HELPARR_USERDATA=userdata)
+        # Compile once, Kodi keeps the bytecode of installed add-ons as well
+        measure(ROUTES["open settings"], 1, env)
+        print(f"{'route':<16}{'median':>10}{'min':>10}{'max':>10}  heavy imports")
+        for name, params in ROUTES.items():
+            samples, heavy = measure(params, args.runs, env)
+            median = statistics.median(samples)
+            print(f"{name:<16}{median:>8.1f}ms{min(samples):>8.1f}ms{max(samples):>8.1f}ms  {', '.join(heavy) or '-'}")
+            if heavy or (args.max_ms and median > args.max_ms):
+                failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
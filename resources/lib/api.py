@@ -0,0 +1,332 @@
+# General python libs
+import json, re, time
+
+# Kodi libs
+import xbmcgui, xbmcaddon
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.jsonstream import iter_records
+
+# Settings prefix for each supported manager
+MANAGERS = {"Radarr": "radarr", "Sonarr": "sonarr"}
+# Settings prefix of every instance, the first one of each manager has the
+# manager's name and the others add a number, e.g. Radarr2 for a 4K server
+INSTANCES = {"Radarr": "radarr", "Radarr2": "radarr2", "Radarr3": "radarr3",
+             "Sonarr": "sonarr", "Sonarr2": "sonarr2", "Sonarr3": "sonarr3"}
+# Status codes worth retrying for idempotent requests
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+# Home window, its properties are shared between all add-on processes
+HOME_WINDOW_ID = 10000
+# Consecutive failures after which requests to a manager fail fast
+CIRCUIT_FAILURE_THRESHOLD = 3
+# Time (seconds) an open circuit waits before letting a trial request through
+CIRCUIT_OPEN_TIME = 30
+# Circuit states
+CIRCUIT_CLOSED      = "closed"
+CIRCUIT_OPEN        = "open"
+CIRCUIT_HALF_OPEN   = "half-open"
+# Part of the error returned while the circuit of a manager is open
+UNREACHABLE_MESSAGE = "is unreachable, not retrying"
+
+# Status code in the error message of both transports
+_HTTP_STATUS = re.compile(r"HTTP Error:\n(?:HTTPError\(['\"])?(\d{3}) ")
+
+# Clients are kept for the lifetime of the Python process so that e.g. the
+# command monitor re-uses the same keep-alive connection for every poll
+_clients = {}
+
+
+def _int_setting(addon, setting_id, default):
+    try:
+        return int(float(addon.getSetting(setting_id)))
+    except (ValueError, TypeError):
+        return default
+
+def _error_details(response):
+    """Extract the validation messages the server sends along with an error status"""
+    try:
+        body = response.json()
+    except Exception:
+        return ""
+    if isinstance(body, dict):
+        body = [body]
+    if not isinstance(body, list):
+        return ""
+    messages = [item.get("errorMessage") or item.get("message") for item in body if isinstance(item, dict)]
+    return "\n".join(message for message in messages if message)
+
+def is_transient_error(response):
+    """Check if a failed request may succeed later, i.e. the server was unreachable or failing
+
+    Client errors (4xx) and validation messages won't change by retrying.
+    """
+    if not isinstance(response, str):
+        return False
+    match = _HTTP_STATUS.match(response)
+    if match:
+        return int(match.group(1)) >= 500
+    return response.startswith(("Error Connecting", "Timeout Error", "Error:")) or UNREACHABLE_MESSAGE in response
+
+def is_not_found_error(response):
+    """Check if a request failed because the server doesn't have the item (404)"""
+    match = _HTTP_STATUS.match(response) if isinstance(response, str) else None
+    return bool(match) and match.group(1) == "404"
+
+class CircuitBreaker:
+    """Health state of a manager, shared by all add-on processes
+
+    After repeated connection failures the circuit opens and requests fail
+    immediately instead of waiting for timeouts. Once CIRCUIT_OPEN_TIME has
+    passed a single trial request (e.g. the background service's status
+    probe) is let through and closes the circuit again when it succeeds.
+    """
+    
+    def __init__(self, manager):
+        self.manager = manager
+        self.property = f"helparr.circuit.{manager}"
+    
+    def load(self):
+        value = xbmcgui.Window(HOME_WINDOW_ID).getProperty(self.property)
+        try:
+            return json.loads(value)
+        except ValueError:
+            return {"state": CIRCUIT_CLOSED, "failures": 0, "since": 0}
+    
+    def save(self, state, failures, since=0):
+        xbmcgui.Window(HOME_WINDOW_ID).setProperty(self.property, json.dumps({"state": state, "failures": failures, "since": since}))
+    
+    def allow(self):
+        """Check if a request may be sent, returns (allowed, seconds until the next trial)"""
+        circuit = self.load()
+        if circuit["state"] == CIRCUIT_CLOSED:
+            return True, 0
+        
+        wait = circuit["since"] + CIRCUIT_OPEN_TIME - time.time()
+        if wait > 0:
+            return False, wait
+        # Let this request through as the trial, others keep failing fast
+        self.save(CIRCUIT_HALF_OPEN, circuit["failures"], time.time())
+        return True, 0
+    
+    def trial_due(self):
+        circuit = self.load()
+        return circuit["state"] != CIRCUIT_CLOSED and time.time() - circuit["since"] >= CIRCUIT_OPEN_TIME
+    
+    def record_success(self):
+        circuit = self.load()
+        if circuit["state"] != CIRCUIT_CLOSED:
+            log.info("%s is reachable again, closing circuit", self.manager)
+        if circuit["state"] != CIRCUIT_CLOSED or circuit["failures"]:
+            self.save(CIRCUIT_CLOSED, 0)
+    
+    def record_failure(self):
+        circuit = self.load()
+        failures = circuit["failures"] + 1
+        if circuit["state"] == CIRCUIT_HALF_OPEN or failures >= CIRCUIT_FAILURE_THRESHOLD:
+            log.warning("%s unreachable after %s failures, opening circuit", self.manager, failures)
+            self.save(CIRCUIT_OPEN, failures, time.time())
+        else:
+            self.save(CIRCUIT_CLOSED, failures)
+
+class ArrClient:
+    """Keep-alive HTTP client for a single Radarr/Sonarr server
+
+    Subclasses implement send() for their HTTP library, this class takes
+    care of URLs and the circuit breaker.
+    """
+    
+    def __init__(self, manager, address, api_key, connect_timeout=3, read_timeout=3, retries=2):
+        self.manager = manager
+        self.address = address
+        self.api_key = api_key
+        self.base_url = f"{address.rstrip('/')}/api/v3/"
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.circuit = CircuitBreaker(manager)
+    
+    def url(self, api_path, arguments=""):
+        url = f"{self.base_url}{api_path}"
+        if arguments:
+            url += f"?{arguments}"
+        return url
+    
+    def send(self, method, url, data, headers, stream=False):
+        """Send a request, returns (status, response or error message, server failure)
+
+        With stream the body of a successful response is left unread for
+        iter_content(), the caller has to close the response.
+        """
+        raise NotImplementedError
+    
+    def request(self, method, api_path, arguments="", data=None, headers=None, stream=False):
+        """Send a request, returns (status, response) like the former helpers"""
+        allowed, wait = self.circuit.allow()
+        if not allowed:
+            return False, f"{self.manager} {UNREACHABLE_MESSAGE} for {int(wait) + 1} seconds"
+        
+        # Only errors that say something about the server's health count
+        status, response, server_failure = self.send(method, self.url(api_path, arguments), data, headers, stream)
+        
+        if status or not server_failure:
+            self.circuit.record_success()
+        else:
+            self.circuit.record_failure()
+        
+        return status, response
+    
+    def get(self, api_path, arguments="", headers=None):
+        return self.request("GET", api_path, arguments, headers=headers)
+    
+    def post(self, api_path, data):
+        return self.request("POST", api_path, data=data)
+    
+    def close(self):
+        pass
+
+class RequestsClient(ArrClient):
+    """Pooled client on top of requests, with urllib3's retries"""
+    
+    def __init__(self, manager, address, api_key, connect_timeout=3, read_timeout=3, retries=2):
+        super().__init__(manager, address, api_key, connect_timeout, read_timeout, retries)
+        
+        # Imported here, requests is by far the slowest import and most
+        # plugin invocations never send a request
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        # Only idempotent methods are retried on read errors and bad status
+        # codes (urllib3 default), POSTs are only retried if the connection
+        # could not be established at all
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=retry)
+        
+        self.session = requests.Session()
+        self.session.headers.update({"X-Api-Key": api_key, "Accept": "application/json"})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def send(self, method, url, data, headers, stream=False):
+        import requests
+        
+        try:
+            response = self.session.request(method, url, json=data, headers=headers, timeout=self.timeout, stream=stream)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            response = f"HTTP Error:\n{repr(e)}"
+            details = _error_details(e.response)
+            if details:
+                response += f"\n{details}"
+            return False, response, e.response is None or e.response.status_code >= 500
+        except requests.exceptions.ConnectionError as e:
+            return False, f"Error Connecting:\n{repr(e)}", True
+        except requests.exceptions.Timeout as e:
+            return False, f"Timeout Error:\n{repr(e)}", True
+        except requests.exceptions.RequestException as e:
+            return False, f"Error:\n{repr(e)}", True
+        return True, response, False
+    
+    def close(self):
+        self.session.close()
+
+def manager_type(instance):
+    """Get the manager of an instance, e.g. Radarr for Radarr2"""
+    return instance.rstrip("0123456789")
+
+def instance_name(instance):
+    """Name of an instance for dialogs, e.g. Radarr2 (4K)"""
+    prefix = INSTANCES.get(instance)
+    name = xbmcaddon.Addon().getSetting(f"{prefix}_name") if prefix and prefix not in MANAGERS.values() else ""
+    return f"{instance} ({name})" if name else instance
+
+def is_configured(manager):
+    """Check if the user has set up a server for a manager or instance"""
+    prefix = INSTANCES.get(manager)
+    return bool(prefix and xbmcaddon.Addon().getSetting(f"{prefix}_addr"))
+
+def configured_instances(manager=None):
+    """Get the instances with a server, of a single manager or all"""
+    return [instance for instance in INSTANCES if (manager is None or manager_type(instance) == manager) and is_configured(instance)]
+
+def get_client(manager):
+    """Get the shared client for an instance, re-created when its settings change"""
+    prefix = INSTANCES.get(manager)
+    if prefix is None:
+        return None
+    
+    addon = xbmcaddon.Addon()
+    address = addon.getSetting(f"{prefix}_addr")
+    api_key = addon.getSetting(f"{prefix}_api")
+    connect_timeout = _int_setting(addon, "connect_timeout", 3)
+    read_timeout = _int_setting(addon, "read_timeout", 3)
+    retries = _int_setting(addon, "get_retries", 2)
+    if addon.getSetting("light_transport") == "true":
+        from resources.lib.lighthttp import LightClient as client_class
+    else:
+        client_class = RequestsClient
+    
+    client = _clients.get(manager)
+    if client is not None:
+        if (type(client), client.address, client.api_key, client.timeout, client.retries) == (client_class, address, api_key, (connect_timeout, read_timeout), retries):
+            return client
+        client.close()
+    
+    log.info("Creating %s for %s at %s", client_class.__name__, manager, address)
+    client = client_class(manager, address, api_key, connect_timeout, read_timeout, retries)
+    _clients[manager] = client
+    return client
+
+def probe_manager(manager):
+    """Check an unhealthy manager with a cheap status request once its trial is due"""
+    if not CircuitBreaker(manager).trial_due():
+        return
+    client = get_client(manager)
+    log.debug("Probing %s system status", manager)
+    client.get("system/status")
+
+def arr_get(manager, api_path, arguments, headers=None, fields=None):
+    """GET an API path, returns (status, response or error message)
+
+    With fields the response has to be a JSON array, which is decoded
+    while it streams in and returned as an iterator of tuples of those
+    fields, e.g. ("id", "tmdbId", "title"), instead of the response. Use it
+    for the collection endpoints so a large library is never held as
+    dicts; the iterator has to be consumed or closed.
+    """
+    client = get_client(manager)
+    if client is None:
+        return False, "Internal error"
+    
+    if fields is None:
+        return client.get(api_path, arguments, headers)
+    
+    status, response = client.request("GET", api_path, arguments, headers=headers, stream=True)
+    if not status:
+        return status, response
+    return status, iter_records(response, fields)
+
+def arr_post(manager, api_path, data):
+    client = get_client(manager)
+    if client is None:
+        return False, "Internal error"
+    
+    status, response = client.post(api_path, data)
+    
+    if status:
+        response_json = response.json()
+        if isinstance(response_json, dict) and response_json.get("severity") == "error":
+            response = response_json.get("errorMessage")
+            status = False
+        else:
+            response = response_json
+    
+    return status, response
@@ -0,0 +1,168 @@
+# General python libs
+import datetime
+from urllib.parse import urlencode
+
+# Kodi libs
+import xbmcgui, xbmcplugin
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, configured_instances, instance_name, manager_type, INSTANCES
+
+# Items per page, the servers page wanted and queue lists themselves
+BROWSE_PAGE_SIZE = 50
+# Days per calendar page and the number of pages ahead
+CALENDAR_DAYS = 14
+CALENDAR_MAX_PAGES = 26
+
+# Browsable lists and their name in the menus
+LISTS = {"wanted": "Wanted", "queue": "Queue", "calendar": "Calendar", "recent": "Recently added"}
+# API path and fixed arguments of each list, series lists include the series for the labels
+SOURCES = {
+    "wanted": {
+        "Radarr": ("wanted/missing", "sortKey=title&sortDirection=ascending&monitored=true"),
+        "Sonarr": ("wanted/missing", "sortKey=airDateUtc&sortDirection=descending&monitored=true&includeSeries=true")
+    },
+    "queue": {
+        "Radarr": ("queue", "includeMovie=true"),
+        "Sonarr": ("queue", "includeSeries=true&includeEpisode=true")
+    },
+    "calendar": {
+        "Radarr": ("calendar", ""),
+        "Sonarr": ("calendar", "includeSeries=true")
+    },
+    # Event type 3 is downloadFolderImported
+    "recent": {
+        "Radarr": ("history", "sortKey=date&sortDirection=descending&eventType=3&includeMovie=true"),
+        "Sonarr": ("history", "sortKey=date&sortDirection=descending&eventType=3&includeSeries=true&includeEpisode=true")
+    }
+}
+
+
+def _url(base_url, **params):
+    return f"{base_url}?{urlencode(params)}"
+
+def _poster(images):
+    for image in images or []:
+        if image.get("coverType") == "poster":
+            return image.get("remoteUrl") or image.get("url")
+    return None
+
+def _episode_label(episode, series):
+    return f"{series.get('title', '')} S{episode.get('seasonNumber', 0):02d}E{episode.get('episodeNumber', 0):02d} - {episode.get('title', '')}"
+
+def _movie_label(movie):
+    return f"{movie.get('title', '')} ({movie['year']})" if movie.get("year") else movie.get("title", "")
+
+def _queue_label2(record):
+    size = record.get("size") or 0
+    percent = int((size - (record.get("sizeleft") or 0)) * 100 / size) if size else 0
+    label2 = f"{percent}% {record.get('trackedDownloadState') or record.get('status', '')}"
+    return f"{label2}, {record['timeleft']} left" if record.get("timeleft") else label2
+
+def _release_date(movie):
+    dates = [movie.get(field, "")[:10] for field in ("inCinemas", "digitalRelease", "physicalRelease") if movie.get(field)]
+    return min(dates) if dates else ""
+
+def describe(kind, manager, record):
+    """Get the label, label2, poster and (search type, ID) of a list record as a dict"""
+    if manager_type(manager) == "Radarr":
+        movie = record.get("movie", record)
+        label, poster = _movie_label(movie), _poster(movie.get("images"))
+        search = ("movie", movie.get("id"))
+    else:
+        episode = record.get("episode", record)
+        series = record.get("series") or episode.get("series") or {}
+        label, poster = _episode_label(episode, series), _poster(series.get("images"))
+        search = ("episode", episode.get("id"))
+
+    if kind == "queue":
+        label2 = _queue_label2(record)
+    elif kind == "calendar":
+        label2 = record.get("airDate", "") if manager_type(manager) == "Sonarr" else _release_date(record)
+        label = f"{label2}  {label}" if label2 else label
+    elif kind == "recent":
+        label2 = record.get("date", "")[:10]
+    else:
+        label2 = ""
+    return {"label": label, "label2": label2, "poster": poster, "search": search}
+
+def list_item(description):
+    """Build the list item of a record description"""
+    item = xbmcgui.ListItem(description["label"], description["label2"], offscreen=True)
+    if description["poster"]:
+        item.setArt({"poster": description["poster"], "thumb": description["poster"]})
+    return item
+
+def _item(kind, manager, record, base_url):
+    """Build (URL, list item, is folder) of a record, wanted items start a search when selected"""
+    description = describe(kind, manager, record)
+    search_type, search_id = description["search"]
+    url = ""
+    if kind == "wanted" and search_id:
+        url = _url(base_url, action="Search", manager=manager, type=search_type, id=search_id, title=description["label"])
+    return url, list_item(description), False
+
+def fetch_page(kind, manager, page):
+    """Get (records, has next page) of a page or (None, error)"""
+    api_path, arguments = SOURCES[kind][manager_type(manager)]
+    if kind == "calendar":
+        start = datetime.date.today() + datetime.timedelta(days=(page - 1) * CALENDAR_DAYS)
+        end = start + datetime.timedelta(days=CALENDAR_DAYS)
+        arguments = "&".join(filter(None, [f"start={start.isoformat()}", f"end={end.isoformat()}", arguments]))
+    else:
+        arguments = f"page={page}&pageSize={BROWSE_PAGE_SIZE}&{arguments}"
+
+    status, response = arr_get(manager, api_path, arguments)
+    if not status:
+        return None, response
+    data = response.json()
+    if kind == "calendar":
+        key = "airDateUtc" if manager_type(manager) == "Sonarr" else None
+        records = sorted(data, key=lambda record: record.get(key, "") if key else _release_date(record))
+        return records, page < CALENDAR_MAX_PAGES
+    records = data.get("records", [])
+    return records, page * BROWSE_PAGE_SIZE < data.get("totalRecords", 0)
+
+def list_root(handle, base_url):
+    """List the browsable lists of all configured managers, returns False if there are none"""
+    managers = configured_instances()
+    if not managers:
+        return False
+    items = []
+    for manager in managers:
+        for kind, name in LISTS.items():
+            items.append((_url(base_url, browse=kind, manager=manager), xbmcgui.ListItem(f"{instance_name(manager)} {name}", offscreen=True), True))
+    items.append((_url(base_url, widgets="all"), xbmcgui.ListItem("Widgets", offscreen=True), True))
+    items.append((_url(base_url, action="OpenSettings"), xbmcgui.ListItem("Settings", offscreen=True), False))
+    xbmcplugin.addDirectoryItems(handle, items, len(items))
+    xbmcplugin.endOfDirectory(handle)
+    return True
+
+def list_page(handle, base_url, kind, manager, page=1):
+    """List a single page of a manager's list with a "next page" item
+
+    Only the requested page is fetched and its items are added in one
+    batch, so long lists cost no more than their first page.
+    """
+    if kind not in SOURCES or manager not in INSTANCES:
+        log.error("Unknown list %s %s", manager, kind)
+        xbmcplugin.endOfDirectory(handle, succeeded=False)
+        return False
+    records, more = fetch_page(kind, manager, page)
+    if records is None:
+        log.warning("Failed to get %s %s page %s: %s", manager, kind, page, log.Payload(more))
+        xbmcgui.Dialog().notification("Helparr", f"Failed to get {manager} {LISTS[kind]}", xbmcgui.NOTIFICATION_ERROR, 3000)
+        xbmcplugin.endOfDirectory(handle, succeeded=False)
+        return False
+    log.debug("%s %s page %s: %s items, more: %s", manager, kind, page, len(records), more)
+
+    items = [_item(kind, manager, record, base_url) for record in records]
+    if more:
+        items.append((_url(base_url, browse=kind, manager=manager, page=page + 1), xbmcgui.ListItem(f"Next page ({page + 1})", offscreen=True), True))
+    xbmcplugin.setPluginCategory(handle, f"{manager} {LISTS[kind]}")
+    xbmcplugin.setContent(handle, "movies" if manager_type(manager) == "Radarr" else "episodes")
+    xbmcplugin.addDirectoryItems(handle, items, len(items))
+    # Queue and wanted lists change all the time
+    xbmcplugin.endOfDirectory(handle, cacheToDisc=False)
+    return True
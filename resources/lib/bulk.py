@@ -0,0 +1,129 @@
+# General python libs
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_post, manager_type
+from resources.lib.episodes import season_monitoring
+from resources.lib.library import LIBRARY_ENDPOINTS, library_lookup, library_check, library_add, library_fetch, refresh_library_index, build_add_payload, is_already_added_error
+from resources.lib.rootfolders import choose_root_folders
+
+# Number of parallel add requests when the bulk import endpoint is unavailable
+BULK_WORKERS = 4
+# Up to this many index hits are confirmed one by one, more rebuild the index once
+BULK_CONFIRM_LIMIT = 20
+
+# Result states of a single item
+ADDED   = "added"
+EXISTS  = "exists"
+FAILED  = "failed"
+
+
+def parse_id_list(value):
+    """Split a comma separated ID list into (valid IDs, invalid entries)"""
+    ids, invalid = [], []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part.isdigit() and int(part) > 0:
+            if int(part) not in ids:
+                ids.append(int(part))
+        else:
+            invalid.append(part)
+    return ids, invalid
+
+def add_single(manager, external_id, quality_profile_id, directory, search, episode_scope=None):
+    """Add one item, returns (state, internal ID, title or error)"""
+    api_path = LIBRARY_ENDPOINTS[manager_type(manager)][0]
+    data = build_add_payload(manager, external_id, quality_profile_id, directory, search)
+    if episode_scope:
+        # Only monitor the requested season
+        data["seasons"] = season_monitoring(episode_scope[0], data.get("seasons"))
+    success, response = arr_post(manager, api_path, data)
+    if success and isinstance(response, dict):
+        library_add(manager, external_id, response.get("id"), response.get("title"))
+        return ADDED, response.get("id"), response.get("title")
+    if is_already_added_error(response):
+        existing = library_fetch(manager, external_id)
+        if existing:
+            return EXISTS, existing[0], existing[1]
+    return FAILED, None, str(response)
+
+def _import(manager, directories, quality_profile_id, search):
+    """Add all items with a single request to the bulk import endpoint
+
+    directories maps the external IDs to their root folders. Returns
+    {external ID: (state, internal ID, title)} for the imported items or
+    None if the endpoint is not available.
+    """
+    api_path, external_field = LIBRARY_ENDPOINTS[manager_type(manager)]
+    data = [build_add_payload(manager, external_id, quality_profile_id, directory, search) for external_id, directory in directories.items()]
+    success, response = arr_post(manager, f"{api_path}/import", data)
+    if not success or not isinstance(response, list):
+        log.warning("%s bulk import not available: %s", manager, log.Payload(response))
+        return None
+    
+    results = {}
+    for item in response:
+        external_id = item.get(external_field)
+        if external_id in directories:
+            library_add(manager, external_id, item.get("id"), item.get("title"))
+            results[external_id] = (ADDED, item.get("id"), item.get("title"))
+    return results
+
+def bulk_add(manager, external_ids, quality_profile_id, search=False, progress=None):
+    """Add many items at once
+
+    Every new item gets its own root folder, so a batch is spread over the
+    folders as the folder policy says. With search the server searches for every added item on its own.
+    progress is called with (done, total, message) after each step and
+    returns {external ID: (state, internal ID, title or error)}.
+    """
+    total = len(external_ids)
+    results = {}
+    
+    def report(message):
+        if progress:
+            progress(len(results), total, message)
+    
+    # Items already in the library only need a check that they are still there
+    hits = [external_id for external_id in external_ids if library_lookup(manager, external_id)]
+    if len(hits) > BULK_CONFIRM_LIMIT and refresh_library_index(manager):
+        # One streamed library fetch is cheaper than a request per item
+        existing = {external_id: library_lookup(manager, external_id) for external_id in hits}
+    else:
+        with ThreadPoolExecutor(max_workers=BULK_WORKERS) as executor:
+            existing = dict(zip(hits, executor.map(lambda external_id: library_check(manager, external_id), hits)))
+    for external_id, entry in existing.items():
+        if entry:
+            results[external_id] = (EXISTS, entry[0], entry[1])
+    report(f"{len(results)} already in {manager}")
+    
+    pending = [external_id for external_id in external_ids if external_id not in results]
+    directories = dict(zip(pending, choose_root_folders(manager, len(pending))))
+    for external_id, directory in list(directories.items()):
+        if directory == "":
+            results[external_id] = (FAILED, None, "No root folder defined")
+            del directories[external_id]
+    pending = list(directories)
+    if pending:
+        report(f"Importing {len(pending)} items to {manager}...")
+        imported = _import(manager, directories, quality_profile_id, search)
+        if imported:
+            results.update(imported)
+            pending = [external_id for external_id in pending if external_id not in results]
+    
+    # Whatever the import endpoint did not take is added one by one
+    if pending:
+        with ThreadPoolExecutor(max_workers=BULK_WORKERS) as executor:
+            futures = {executor.submit(add_single, manager, external_id, quality_profile_id, directories[external_id], search): external_id for external_id in pending}
+            for future in as_completed(futures):
+                external_id = futures[future]
+                try:
+                    results[external_id] = future.result()
+                except Exception as e:
+                    results[external_id] = (FAILED, None, repr(e))
+                report(f"{external_id}: {results[external_id][0]}")
+    
+    return results
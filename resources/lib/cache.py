@@ -0,0 +1,10 @@
+# Kodi libs
+import xbmcvfs
+
+
+def get_cache_path():
+    """Get the addon cache directory path"""
+    addon_data_path = xbmcvfs.translatePath("special://userdata/addon_data/plugin.module.helparr/")
+    if not xbmcvfs.exists(addon_data_path):
+        xbmcvfs.mkdirs(addon_data_path)
+    return addon_data_path
@@ -0,0 +1,216 @@
+# General python libs
+import threading, time
+
+# Kodi libs
+import xbmcgui
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get
+from resources.lib.durations import parse_duration, parse_timestamp
+from resources.lib.metrics import span
+
+# Interval (seconds) in which the queue of a manager with tracked items is polled
+DOWNLOAD_POLL_INTERVAL = 15
+# Items that never show up in the queue after their search are dropped after this long
+GRAB_TIMEOUT = 5 * 60
+# Tracking gives up on downloads that take longer than this (seconds)
+DOWNLOAD_TIMEOUT = 24 * 60 * 60
+# Progress is announced whenever a download passes one of these steps (percent)
+PROGRESS_STEP = 25
+# History records fetched per request and the most requests per tick
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGES = 5
+# History event types that end tracking
+IMPORT_EVENTS = ("downloadFolderImported",)
+FAILED_EVENTS = ("downloadFailed",)
+
+# Content ID fields of the search commands, in the form queue and history records use them
+COMMAND_CONTENT_FIELDS = {"movieIds": "movieId", "seriesId": "seriesId", "episodeIds": "episodeId"}
+# Fields of the queue records, the rest of each record is never decoded into dicts
+QUEUE_FIELDS = ("movieId", "seriesId", "episodeId", "size", "sizeleft", "timeleft", "trackedDownloadState")
+
+
+def content_keys(command_data):
+    """Get [(field, content ID)] of the content a search command was for"""
+    keys = []
+    for body_field, field in COMMAND_CONTENT_FIELDS.items():
+        ids = (command_data or {}).get("body", {}).get(body_field)
+        for content_id in ids if isinstance(ids, list) else [ids]:
+            if content_id:
+                keys.append((field, content_id))
+    return keys
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def _format_eta(seconds):
+    if seconds is None:
+        return ""
+    if seconds < 60 * 60:
+        return f", {int(-(-seconds // 60))} min left"
+    return f", {seconds / 3600:.1f} h left"
+
+class DownloadTracker:
+    """Follows searched content through grab, download and import
+
+    Every tick each manager with tracked items is asked for its whole queue
+    and its history once, no matter how many items are followed. The history
+    is read as a diff: only events newer than the last one seen are looked
+    at, so the import that ends tracking is noticed without re-processing
+    old pages. New items make the next read go back to the time their
+    search was queued, so events from before tracking started still count.
+    """
+
+    def __init__(self, on_change=None):
+        # Called with (manager, widget feeds) when a download starts or ends
+        self.on_change = on_change
+        # {(manager, field, content ID): {"title", "started", "seen", "percent"}}
+        self.items = {}
+        # {manager: ID of the newest history event already seen}
+        self.last_event = {}
+        # {manager: server time the history has to be read back to}
+        self.since = {}
+        # {manager: time of the last poll}
+        self.last_poll = {}
+        # Items are added from the notification and SignalR threads
+        self.lock = threading.RLock()
+
+    def track(self, manager, content_title, command_data):
+        """Start following the content of a completed search"""
+        now = time.time()
+        # The search may have grabbed before it completed
+        since = parse_timestamp((command_data or {}).get("queued")) or now
+        with self.lock:
+            for field, content_id in content_keys(command_data):
+                log.debug("Tracking downloads of %s %s %s", manager, field, content_id)
+                self.items[(manager, field, content_id)] = {"title": content_title, "started": now, "seen": False, "percent": None}
+                self.since[manager] = min(since, self.since.get(manager, since))
+
+    def managers(self):
+        with self.lock:
+            return {manager for manager, _, _ in self.items}
+
+    def tick(self, now):
+        for manager in self.managers():
+            if now - self.last_poll.get(manager, 0) < DOWNLOAD_POLL_INTERVAL:
+                continue
+            self.last_poll[manager] = now
+            with self.lock:
+                self.poll_manager(manager)
+        # A baseline only stays valid while its manager is polled
+        for manager in set(self.last_event) - self.managers():
+            del self.last_event[manager]
+            self.since.pop(manager, None)
+
+    def poll_manager(self, manager):
+        keys = [key for key in self.items if key[0] == manager]
+        with span("downloads", manager):
+            queue = self.fetch_queue(manager)
+            events = self.fetch_new_events(manager) if queue is not None else None
+        if queue is None:
+            return
+
+        for key in keys:
+            _, field, content_id = key
+            records = [record for record in queue if record[field] == content_id]
+            if records:
+                self.update_progress(key, records)
+            for event in events or []:
+                if event.get(field) != content_id:
+                    continue
+                if event.get("eventType") in IMPORT_EVENTS and not records:
+                    self.finish(key, f"Imported '{self.items[key]['title']}'", xbmcgui.NOTIFICATION_INFO)
+                    break
+                if event.get("eventType") in FAILED_EVENTS:
+                    self.finish(key, f"Download failed for '{self.items[key]['title']}'", xbmcgui.NOTIFICATION_ERROR)
+                    break
+            if key in self.items:
+                self.check_timeout(key)
+
+    def fetch_queue(self, manager):
+        """Get the queue records as dicts of QUEUE_FIELDS or None"""
+        status, records = arr_get(manager, "queue/details", "", fields=QUEUE_FIELDS)
+        if not status:
+            log.warning("Failed to get %s queue: %s", manager, log.Payload(records))
+            return None
+        try:
+            return [dict(zip(QUEUE_FIELDS, record)) for record in records]
+        except Exception as e:
+            log.warning("Failed to read %s queue: %s", manager, e)
+            return None
+
+    def fetch_new_events(self, manager):
+        """Get the history events since the last call, oldest first
+
+        After new items were tracked the events since their searches were
+        queued are read as well, events from before that must not end
+        tracking.
+        """
+        last_event = self.last_event.get(manager)
+        since = self.since.get(manager)
+        newest = last_event or 0
+        events = []
+        for page in range(1, HISTORY_MAX_PAGES + 1):
+            status, response = arr_get(manager, "history", f"page={page}&pageSize={HISTORY_PAGE_SIZE}&sortKey=date&sortDirection=descending")
+            if not status:
+                log.warning("Failed to get %s history: %s", manager, log.Payload(response))
+                return []
+            try:
+                records = response.json().get("records", [])
+            except (ValueError, AttributeError) as e:
+                log.warning("Invalid %s history: %s", manager, e)
+                return []
+            newest = max([newest] + [record.get("id", 0) for record in records])
+            new_records = [record for record in records if (last_event is not None and record.get("id", 0) > last_event)
+                           or (since is not None and (parse_timestamp(record.get("date")) or 0) >= since)]
+            events.extend(new_records)
+            if len(new_records) < len(records) or len(records) < HISTORY_PAGE_SIZE:
+                break
+        self.last_event[manager] = newest
+        self.since.pop(manager, None)
+        if events:
+            log.debug("%s new %s history events", len(events), manager)
+        return sorted(events, key=lambda event: event["id"])
+
+    def update_progress(self, key, records):
+        item = self.items[key]
+        size = sum(record["size"] or 0 for record in records)
+        left = sum(record["sizeleft"] or 0 for record in records)
+        percent = int((size - left) * 100 / size) if size else 0
+        etas = [parse_duration(record["timeleft"]) for record in records]
+        eta = max((eta for eta in etas if eta is not None), default=None)
+        log.debug("%s download %s%%, states %s", item["title"], percent, [record["trackedDownloadState"] for record in records])
+
+        if not item["seen"]:
+            item["seen"] = True
+            if self.on_change:
+                self.on_change(key[0], ["downloading"])
+            message = f"Downloading '{item['title']}' ({_format_size(size)}{_format_eta(eta)})"
+        elif percent // PROGRESS_STEP > item["percent"] // PROGRESS_STEP and percent < 100:
+            message = f"'{item['title']}' {percent}% downloaded{_format_eta(eta)}"
+        else:
+            message = None
+        item["percent"] = percent
+        if message:
+            xbmcgui.Dialog().notification("Helparr", message, xbmcgui.NOTIFICATION_INFO, 3000)
+
+    def check_timeout(self, key):
+        item = self.items[key]
+        elapsed = time.time() - item["started"]
+        if not item["seen"] and elapsed > GRAB_TIMEOUT:
+            log.debug("Nothing grabbed for %s", item["title"])
+            self.finish(key, f"No download found for '{item['title']}'", xbmcgui.NOTIFICATION_WARNING)
+        elif elapsed > DOWNLOAD_TIMEOUT:
+            self.finish(key, f"Download tracking timed out for '{item['title']}'", xbmcgui.NOTIFICATION_WARNING)
+
+    def finish(self, key, message, icon):
+        log.debug("Stopped tracking %s: %s", key, message)
+        del self.items[key]
+        if self.on_change:
+            self.on_change(key[0], ["downloading", "recent"])
+        xbmcgui.Dialog().notification("Helparr", message, icon, 5000 if icon != xbmcgui.NOTIFICATION_INFO else 3000)
@@ -0,0 +1,87 @@
+# General python libs
+import calendar, random, re, time
+
+# Helparr libs
+from resources.lib.store import get_meta, set_meta
+
+# Upper bounds (seconds) of the histogram buckets, the last one is open ended
+BUCKETS = (2, 4, 8, 15, 30, 60, 120, 240, 480)
+# Estimates are only trusted after this many observations
+MIN_SAMPLES = 3
+# Polling limits (seconds)
+MIN_POLL_DELAY = 1
+MAX_POLL_DELAY = 60
+
+
+def _key(manager, command_name):
+    return f"durations.{manager}.{command_name}"
+
+def parse_duration(value):
+    """Parse a .NET TimeSpan like "00:01:02.5000000" into seconds or None"""
+    match = re.match(r"^(?:(\d+)\.)?(\d+):(\d+):(\d+(?:\.\d+)?)$", str(value or ""))
+    if not match:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def parse_timestamp(value):
+    """Parse a server UTC time like "2024-05-01T12:00:00.1234567Z" into a Unix time or None"""
+    try:
+        return calendar.timegm(time.strptime(str(value or "")[:19], "%Y-%m-%dT%H:%M:%S"))
+    except ValueError:
+        return None
+
+def record_duration(manager, command_name, seconds):
+    """Add an observed command duration to the persistent histogram"""
+    counts = get_meta(_key(manager, command_name)) or [0] * (len(BUCKETS) + 1)
+    bucket = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+    counts[bucket] += 1
+    set_meta(_key(manager, command_name), counts)
+
+def _quantile(counts, fraction):
+    target = fraction * sum(counts)
+    seen = 0
+    for i, count in enumerate(counts):
+        seen += count
+        if seen >= target and count:
+            # Use the middle of the bucket as the estimate
+            lower = BUCKETS[i - 1] if i > 0 else 0
+            upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1] * 2
+            return (lower + upper) / 2
+    return None
+
+def estimate_duration(manager, command_name):
+    """Get (median, 90th percentile) of the learned duration or None"""
+    counts = get_meta(_key(manager, command_name))
+    if not counts or sum(counts) < MIN_SAMPLES:
+        return None
+    return _quantile(counts, 0.5), _quantile(counts, 0.9)
+
+def next_poll_delay(elapsed, estimate, polls, base_interval):
+    """Seconds to wait before the next poll of a command
+
+    Polls densely around the expected completion and backs off exponentially
+    with jitter before and after it. Without an estimate the configured
+    interval is used as before.
+    """
+    if estimate is None:
+        return base_interval
+    
+    median, p90 = estimate
+    window_start = median * 0.75
+    if elapsed < window_start:
+        # Sleep towards the expected completion, doubling the step each time
+        delay = min(window_start - elapsed, base_interval * 2 ** polls)
+    elif elapsed <= p90:
+        delay = max(MIN_POLL_DELAY, base_interval / 3)
+    else:
+        # Overdue, back off relative to how late the command is
+        delay = base_interval * 2 ** min(polls, 5)
+    delay *= random.uniform(0.8, 1.2)
+    return max(MIN_POLL_DELAY, min(MAX_POLL_DELAY, delay))
+
+def estimated_progress(elapsed, estimate, fallback):
+    """Progress bar value from the learned duration, at most 90 until completed"""
+    if estimate is None:
+        return fallback
+    return min(90, int(90 * elapsed / max(estimate[1], 1)))
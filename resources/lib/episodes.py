@@ -0,0 +1,66 @@
+# Kodi libs
+import xbmc
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get
+from resources.lib.store import replace_episodes, get_episode
+
+# How long to wait for the episodes of a newly added series (seconds)
+EPISODE_WAIT_TIMEOUT = 30
+
+
+def parse_episode_scope(season, episode):
+    """Convert the season/episode plugin parameters to (season, episode or None) or None"""
+    try:
+        season = int(season)
+    except (ValueError, TypeError):
+        return None
+    try:
+        episode = int(episode)
+    except (ValueError, TypeError):
+        episode = None
+    return season, episode
+
+def season_monitoring(season, seasons=None):
+    """Seasons list for an add request that only monitors one season
+
+    seasons is the list of the add payload, every season in it is kept so
+    Sonarr does not miss the others, only their monitoring changes.
+    """
+    if not seasons:
+        return [{"seasonNumber": season, "monitored": True}]
+    return [dict(item, monitored=item.get("seasonNumber") == season) for item in seasons]
+
+def fetch_episodes(manager, series_id):
+    """Fetch and store the (season, episode) -> episode ID map of a series"""
+    status, response = arr_get(manager, "episode", f"seriesId={series_id}")
+    if not status:
+        log.error("Failed to fetch episodes of series %s: %s", series_id, log.Payload(response))
+        return {}
+    
+    episodes = {(item.get("seasonNumber"), item.get("episodeNumber")): item.get("id") for item in response.json()}
+    if episodes:
+        replace_episodes(manager, series_id, [(season, episode, episode_id) for (season, episode), episode_id in episodes.items()])
+    log.debug("Cached %s episodes of series %s", len(episodes), series_id)
+    return episodes
+
+def get_episode_id(manager, series_id, season, episode, just_added=False):
+    """Get the Sonarr episode ID of an episode or None
+
+    The cache is used when it knows the episode. A series that was just
+    added gets its episodes only after Sonarr refreshed it, so only then
+    an empty episode list is waited for.
+    """
+    episode_id = get_episode(manager, series_id, season, episode)
+    if episode_id:
+        return episode_id
+    
+    waited = 0
+    while True:
+        episodes = fetch_episodes(manager, series_id)
+        episode_id = episodes.get((season, episode))
+        if episode_id or episodes or not just_added or waited >= EPISODE_WAIT_TIMEOUT:
+            return episode_id
+        xbmc.sleep(2000)
+        waited += 2
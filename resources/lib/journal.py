@@ -0,0 +1,138 @@
+# General python libs
+import time
+
+# Kodi libs
+import xbmcgui
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_post, is_transient_error, manager_type
+from resources.lib.episodes import season_monitoring
+from resources.lib.metadata import get_title
+from resources.lib.library import LIBRARY_ENDPOINTS, library_check, library_add, library_fetch, build_add_payload, build_search_command, is_already_added_error
+from resources.lib.store import add_journal_entry, get_due_journal_entries, get_next_journal_attempt, update_journal_entry, prune_journal
+
+# Entry states
+PENDING = "pending"
+DONE    = "done"
+FAILED  = "failed"
+
+# Delay (seconds) before the first retry, doubled with every attempt
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 30 * 60
+# Requests still failing after this long (seconds) are given up
+JOURNAL_MAX_AGE = 7 * 24 * 60 * 60
+# Finished entries are kept this long for troubleshooting
+JOURNAL_KEEP_TIME = 24 * 60 * 60
+
+
+def enqueue_add(manager, external_id, quality_profile_id, directory, search=False, episode_scope=None):
+    """Write an add request to the journal for the background service, returns its entry ID"""
+    request = {
+        "quality_profile_id": quality_profile_id,
+        "directory": directory,
+        "search": search,
+        "episode_scope": list(episode_scope) if episode_scope else None
+    }
+    entry_id = add_journal_entry(manager, external_id, request, time.time())
+    log.debug("Journaled %s add of %s as entry %s: %s", manager, external_id, entry_id, log.Payload(request))
+    return entry_id
+
+def next_attempt():
+    """Get the time the next journaled request is due or None"""
+    return get_next_journal_attempt()
+
+def _retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+def _content_title(manager, external_id, title, episode_scope):
+    title = title or get_title(manager, external_id) or (f"Movie {external_id}" if manager_type(manager) == "Radarr" else f"Series {external_id}")
+    if episode_scope:
+        season, episode = episode_scope
+        title += f" S{season:02d}" + (f"E{episode:02d}" if episode is not None else "")
+    return title
+
+def _add(manager, external_id, request):
+    """Add an item unless it is already in the library, returns (status, (ID, title) or error)"""
+    # Replays must be idempotent, an earlier attempt may have reached the
+    # server even though its response got lost
+    existing = library_check(manager, external_id) or library_fetch(manager, external_id)
+    if existing:
+        log.debug("%s %s already added, skipping add request", manager, external_id)
+        return True, existing
+
+    data = build_add_payload(manager, int(external_id), request["quality_profile_id"], request["directory"])
+    if request["episode_scope"]:
+        # Only monitor the requested season
+        data["seasons"] = season_monitoring(request["episode_scope"][0], data.get("seasons"))
+    success, response = arr_post(manager, LIBRARY_ENDPOINTS[manager_type(manager)][0], data)
+    if success and isinstance(response, dict):
+        library_add(manager, external_id, response.get("id"), response.get("title"))
+        return True, (response.get("id"), response.get("title"))
+    if is_already_added_error(response):
+        existing = library_fetch(manager, external_id)
+        if existing:
+            return True, existing
+    return False, response
+
+def _search(manager, content_id, content_title, episode_scope, register_command):
+    content_type = "movie" if manager_type(manager) == "Radarr" else "series"
+    # The series was added by this request, possibly by an earlier attempt
+    # whose response got lost, so its episodes may still be refreshing
+    data, error = build_search_command(manager, content_type, content_id, tuple(episode_scope) if episode_scope else None, True)
+    if data is None:
+        log.warning("Not searching for %s: %s", content_title, error)
+        return
+    success, response = arr_post(manager, "command", data)
+    if success and isinstance(response, dict) and response.get("id"):
+        if register_command:
+            register_command(manager, response["id"], content_title, response.get("name", ""))
+    else:
+        log.warning("Search for %s failed: %s", content_title, log.Payload(response))
+
+def replay_entry(entry, register_command=None):
+    """Send a journaled add request and update its entry, returns its new state"""
+    manager, external_id, request = entry["manager"], entry["external_id"], entry["request"]
+    attempts = entry["attempts"] + 1
+    success, result = _add(manager, external_id, request)
+
+    if success:
+        content_id, title = result
+        content_title = _content_title(manager, external_id, title, request["episode_scope"])
+        update_journal_entry(entry["id"], DONE, attempts, time.time())
+        log.info("Journaled %s add of %s done after %s attempts", manager, content_title, attempts)
+        xbmcgui.Dialog().notification("Helparr", f"'{content_title}' added to {manager}", xbmcgui.NOTIFICATION_INFO, 3000)
+        if request["search"] and content_id:
+            _search(manager, content_id, content_title, request["episode_scope"], register_command)
+        return DONE
+
+    content_title = _content_title(manager, external_id, None, request["episode_scope"])
+    if is_transient_error(result) and time.time() - entry["created"] < JOURNAL_MAX_AGE:
+        delay = _retry_delay(attempts)
+        update_journal_entry(entry["id"], PENDING, attempts, time.time() + delay, str(result))
+        log.warning("Journaled %s add of %s failed, retrying in %ss: %s", manager, content_title, delay, log.Payload(result))
+        return PENDING
+
+    update_journal_entry(entry["id"], FAILED, attempts, time.time(), str(result))
+    log.error("Journaled %s add of %s failed: %s", manager, content_title, log.Payload(result))
+    xbmcgui.Dialog().notification("Helparr", f"Failed to add '{content_title}' to {manager}", xbmcgui.NOTIFICATION_ERROR, 5000)
+    return FAILED
+
+def replay_journal(register_command=None):
+    """Replay all due requests in the order they were made, returns the managers that got content
+
+    register_command is called with (manager, command ID, title, command
+    name) for every search started, so it can be monitored.
+    """
+    now = time.time()
+    prune_journal(now - JOURNAL_KEEP_TIME)
+    added = set()
+    for entry in get_due_journal_entries(now):
+        try:
+            if replay_entry(entry, register_command) == DONE:
+                added.add(entry["manager"])
+        except Exception as e:
+            # An entry that can't even be attempted must not block the others
+            update_journal_entry(entry["id"], FAILED, entry["attempts"] + 1, time.time(), repr(e))
+            log.error("Replaying journal entry %s failed: %s", entry["id"], e)
+    return added
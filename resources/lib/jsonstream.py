@@ -0,0 +1,71 @@
+# General python libs
+import codecs, json
+
+# Size (bytes) of the chunks read from a streamed response
+CHUNK_SIZE = 64 * 1024
+# Characters skipped between the elements of an array
+_SEPARATORS = " \t\r\n,"
+
+
+class JSONStreamError(ValueError):
+    pass
+
+def project(item, fields):
+    """Get a tuple of the fields of an item, dotted fields reach into nested objects"""
+    values = []
+    for field in fields:
+        value = item
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        values.append(value)
+    return tuple(values)
+
+def iter_array(chunks, fields):
+    """Decode a top-level JSON array from byte chunks one element at a time
+
+    Only the current element is held as Python objects, every element is
+    reduced to a tuple of its fields right away, so memory stays bounded
+    by the largest element instead of the whole body.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        buffer += text.decode(chunk)
+        position = 0
+        if not started:
+            position = len(buffer) - len(buffer.lstrip())
+            if position == len(buffer):
+                continue
+            if buffer[position] != "[":
+                raise JSONStreamError("Response is not a JSON array")
+            position += 1
+            started = True
+
+        while True:
+            while position < len(buffer) and buffer[position] in _SEPARATORS:
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                return
+            if buffer[position] not in "{[":
+                raise JSONStreamError(f"Unexpected array element at '{buffer[position:position + 20]}'")
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The element continues in the next chunk
+                break
+            yield project(item, fields)
+            position = end
+        buffer = buffer[position:]
+
+    raise JSONStreamError("Response ended before the JSON array was complete")
+
+def iter_records(response, fields):
+    """Stream a requests-like response and yield the fields of each element of its array"""
+    try:
+        yield from iter_array(response.iter_content(CHUNK_SIZE), fields)
+    finally:
+        response.close()
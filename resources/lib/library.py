@@ -0,0 +1,151 @@
+# General python libs
+import time
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, is_not_found_error, manager_type
+from resources.lib.episodes import get_episode_id
+from resources.lib.metadata import get_metadata
+from resources.lib.store import replace_library, upsert_library_item, get_library_item, delete_library_item, get_meta, set_meta
+
+# API endpoint and external ID field for each manager
+LIBRARY_ENDPOINTS = {"Radarr": ("movie", "tmdbId"), "Sonarr": ("series", "tvdbId")}
+# Rebuild the whole index once it is older than this (seconds), our own adds
+# and "already added" errors keep it fresh in between
+LIBRARY_INDEX_MAX_AGE = 24 * 60 * 60
+# Message Radarr/Sonarr send when the external ID is already in the library
+ALREADY_ADDED_MESSAGE = "already been added"
+
+
+def _updated_key(manager):
+    return f"library.{manager}.updated"
+
+def library_index_is_stale(manager):
+    return time.time() - get_meta(_updated_key(manager), 0) > LIBRARY_INDEX_MAX_AGE
+
+def library_lookup(manager, external_id):
+    """Get (internal ID, title) of an item already in the library or None"""
+    entry = get_library_item(manager, external_id)
+    if entry:
+        log.debug("%s library index hit for %s: %s", manager, external_id, log.Payload(entry))
+    return entry
+
+def library_check(manager, external_id):
+    """Get (internal ID, title) of an indexed item that is still on the server or None
+
+    Items deleted on the server stay in the index until its next rebuild, so
+    a hit is confirmed by asking for that single item. A 404 drops the entry,
+    other failures keep trusting the index.
+    """
+    entry = library_lookup(manager, external_id)
+    if not entry or not entry[0]:
+        return entry
+    api_path = LIBRARY_ENDPOINTS[manager_type(manager)][0]
+    status, response = arr_get(manager, f"{api_path}/{entry[0]}", "")
+    if status or not is_not_found_error(response):
+        return entry
+    log.info("%s %s was deleted on the server, dropping it from the library index", manager, external_id)
+    delete_library_item(manager, external_id)
+    return None
+
+def library_add(manager, external_id, content_id, content_title):
+    """Add a single item to the index, e.g. after adding it to the server"""
+    upsert_library_item(manager, external_id, content_id, content_title)
+
+def refresh_library_index(manager):
+    """Rebuild the whole index from the server's library"""
+    api_path, external_field = LIBRARY_ENDPOINTS[manager_type(manager)]
+    log.debug("Rebuilding %s library index", manager)
+    
+    # Libraries get big, only decode the three fields the index needs
+    status, records = arr_get(manager, api_path, "", fields=(external_field, "id", "title"))
+    if not status:
+        log.error("Failed to rebuild %s library index: %s", manager, log.Payload(records))
+        return False
+    
+    try:
+        # Collected before writing so the store isn't locked while the body streams in
+        items = [record for record in records if record[0]]
+    except Exception as e:
+        log.error("Failed to read %s library: %s", manager, e)
+        return False
+    replace_library(manager, items)
+    set_meta(_updated_key(manager), time.time())
+    log.debug("Indexed %s %s library items", len(items), manager)
+    return True
+
+def update_library_index(manager):
+    """Rebuild the index if it is missing or too old"""
+    if library_index_is_stale(manager):
+        return refresh_library_index(manager)
+    return True
+
+def build_add_payload(manager, external_id, quality_profile_id, directory, search=False):
+    """Build the add request body for a movie or series
+
+    Items looked up before get a complete body from the cached lookup
+    result, which the server can take as it is, the others a minimal one
+    that the server completes with its own lookup. With search the server
+    starts searching right after adding, which saves the separate search
+    command request.
+    """
+    kind = manager_type(manager)
+    external_field = LIBRARY_ENDPOINTS[kind][1]
+    data = dict(get_metadata(manager, external_id) or {"title": "title"})
+    data.update({
+            "qualityProfileId": quality_profile_id,
+            external_field: external_id,
+            "rootFolderPath": directory,
+            "monitored": True
+        })
+    if kind == "Radarr":
+        data["minimumAvailability"] = "released"
+    elif "seasons" in data:
+        # Monitor everything but the specials, like the Sonarr UI does
+        data["seasons"] = [{"seasonNumber": season["seasonNumber"], "monitored": season["seasonNumber"] > 0} for season in data["seasons"]]
+    if search:
+        search_option = "searchForMovie" if manager_type(manager) == "Radarr" else "searchForMissingEpisodes"
+        data["addOptions"] = {search_option: True}
+    return data
+
+def build_search_command(manager, content_type, content_id, episode_scope=None, just_added=False):
+    """Build the search command for an item, returns (command data, None) or (None, error)
+
+    For series an episode_scope of (season, episode or None) limits the
+    search to that episode or season, just_added waits for the episodes
+    of a series the caller added itself.
+    """
+    kind = manager_type(manager)
+    if kind == "Radarr" and content_type == "movie":
+        return {"name": "MoviesSearch", "movieIds": [content_id]}, None
+    if kind == "Sonarr" and content_type == "series" and episode_scope:
+        season, episode = episode_scope
+        if episode is None:
+            return {"name": "SeasonSearch", "seriesId": content_id, "seasonNumber": season}, None
+        episode_id = get_episode_id(manager, content_id, season, episode, just_added)
+        if not episode_id:
+            return None, f"Episode S{season:02d}E{episode:02d} not found"
+        return {"name": "EpisodeSearch", "episodeIds": [episode_id]}, None
+    if kind == "Sonarr" and content_type == "series":
+        return {"name": "SeriesSearch", "seriesId": content_id}, None
+    if kind == "Sonarr" and content_type == "episode":
+        return {"name": "EpisodeSearch", "episodeIds": [content_id]}, None
+    return None, "Unsupported manager or content type"
+
+def is_already_added_error(response):
+    return isinstance(response, str) and ALREADY_ADDED_MESSAGE in response
+
+def library_fetch(manager, external_id):
+    """Look up a single item on the server by external ID and add it to the index"""
+    api_path, external_field = LIBRARY_ENDPOINTS[manager_type(manager)]
+    status, response = arr_get(manager, api_path, f"{external_field}={external_id}")
+    if status:
+        items = response.json()
+        if isinstance(items, dict):
+            items = [items]
+        for item in items:
+            if str(item.get(external_field)) == str(external_id):
+                library_add(manager, external_id, item.get("id"), item.get("title"))
+                return item.get("id"), item.get("title")
+    log.warning("Could not find %s in %s library: %s", external_id, manager, log.Payload(response))
+    return None
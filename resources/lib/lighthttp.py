@@ -0,0 +1,180 @@
+# General python libs
+import http.client, json, socket, threading
+from urllib.parse import urlsplit
+
+# Kodi libs
+import xbmc
+
+# Helparr libs
+from resources.lib.api import ArrClient, RETRY_STATUS_CODES, _error_details
+
+# Errors of a kept-alive connection the server closed in the meantime
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HttpResponse:
+    """The parts of a requests response the add-on uses
+
+    The body is read on first access, or in chunks by iter_content().
+    release(reusable) hands the connection back once the body is read.
+    """
+
+    def __init__(self, raw, release):
+        self.raw = raw
+        self.release = release
+        self.status_code = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read()
+            self.close()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size):
+        if self._content is not None:
+            yield self._content
+            return
+        try:
+            while True:
+                chunk = self.raw.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.release is not None:
+            # A connection with unread body can't be used for the next request
+            self.release(self.raw.isclosed() and not self.raw.will_close)
+            self.release = None
+
+class LightClient(ArrClient):
+    """Client on top of http.client, which loads a lot faster than requests
+
+    Every thread keeps one keep-alive connection. Retries follow the
+    requests client: GETs are retried on connection errors, timeouts and
+    RETRY_STATUS_CODES, POSTs only if the connection could not be
+    established at all.
+    """
+
+    def __init__(self, manager, address, api_key, connect_timeout=3, read_timeout=3, retries=2):
+        super().__init__(manager, address, api_key, connect_timeout, read_timeout, retries)
+        parts = urlsplit(address)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.headers = {"X-Api-Key": api_key, "Accept": "application/json"}
+        self.local = threading.local()
+        self.connections = []
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.connection_class(self.host, self.port, timeout=self.timeout[0])
+            conn.connect()
+            conn.sock.settimeout(self.timeout[1])
+            self.local.conn = conn
+            self.connections.append(conn)
+        return conn
+
+    def drop_connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.connections.remove(conn)
+            self.local.conn = None
+
+    def detach_connection(self):
+        """Take this thread's connection out of use while a response body streams"""
+        conn = self.local.conn
+        self.local.conn = None
+
+        def release(reusable):
+            if reusable and getattr(self.local, "conn", None) is None:
+                self.local.conn = conn
+            else:
+                conn.close()
+                if conn in self.connections:
+                    self.connections.remove(conn)
+        return release
+
+    def exchange(self, method, url, body, headers, stream=False, reused=False):
+        """Send a request on this thread's connection, re-connecting once if it went stale
+
+        Only a kept-alive connection from an earlier request can go stale,
+        on a fresh connection the error is raised as it is.
+        """
+        conn = self.connection()
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            self.drop_connection()
+            if not reused:
+                raise
+            conn = self.connection()
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+        response = HttpResponse(response, self.detach_connection())
+        if not stream or response.status_code >= 400:
+            # Reading the whole body hands the connection back right away
+            response.content
+        return response
+
+    def send(self, method, url, data, headers, stream=False):
+        parts = urlsplit(url)
+        path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        request_headers = dict(self.headers, **(headers or {}))
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode("utf-8")
+            request_headers["Content-Type"] = "application/json"
+
+        attempt = 0
+        while True:
+            connected = False
+            try:
+                reused = getattr(self.local, "conn", None) is not None
+                self.connection()
+                connected = True
+                response = self.exchange(method, path, body, request_headers, stream, reused)
+            except socket.timeout as e:
+                self.drop_connection()
+                error = f"Timeout Error:\n{repr(e)}"
+            except (OSError, http.client.HTTPException) as e:
+                self.drop_connection()
+                error = f"Error Connecting:\n{repr(e)}"
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or method != "GET" or attempt >= self.retries:
+                    break
+                error = None
+
+            if attempt >= self.retries or (method != "GET" and connected):
+                return False, error, True
+            attempt += 1
+            xbmc.sleep(int(500 * 2 ** (attempt - 1)))
+
+        if response.status_code >= 400:
+            error = f"HTTP Error:\n{response.status_code} {response.reason} for url: {url}"
+            details = _error_details(response)
+            if details:
+                error += f"\n{details}"
+            return False, error, response.status_code >= 500
+        return True, response, False
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        self.connections = []
@@ -0,0 +1,127 @@
+# General python libs
+import json, os, time
+from collections import deque
+
+# Kodi libs
+import xbmcaddon, xbmc
+
+# Helparr libs
+from resources.lib.cache import get_cache_path
+
+LOG_PREFIX = "[HELPARR] "
+# Messages kept in memory for DumpDebugLog, debug ones included
+RING_BUFFER_SIZE = 1000
+# Longest payload summary (characters) in a message
+PAYLOAD_LIMIT = 300
+# Time (seconds) the debug setting is cached, the service re-reads it
+SETTING_CACHE_TIME = 30
+# Directory in the cache path with the buffers saved after failures
+DEBUG_LOG_DIR = "logs"
+# Name of the buffer the service saves on request, next to its failure buffer
+LIVE_SERVICE_LOG = "service_live"
+
+# (time, level name, message, args) with the formatting left for later
+_ring = deque(maxlen=RING_BUFFER_SIZE)
+_role = "plugin"
+_failed = False
+_debug = (0, False)
+
+
+class Payload:
+    """Size-capped summary of an API payload, only built when a message is formatted"""
+
+    def __init__(self, value, limit=PAYLOAD_LIMIT):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        if isinstance(self.value, (dict, list)):
+            try:
+                text = json.dumps(self.value, separators=(",", ":"), default=str)
+            except ValueError:
+                text = repr(self.value)
+        else:
+            text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text)} chars)"
+
+def set_role(role):
+    """Name of this process (plugin or service) for the saved buffer"""
+    global _role
+    _role = role
+
+def debug_enabled():
+    global _debug
+    checked, enabled = _debug
+    now = time.time()
+    if now - checked > SETTING_CACHE_TIME:
+        enabled = xbmcaddon.Addon().getSetting("debug_logging") == "true"
+        _debug = (now, enabled)
+    return enabled
+
+def _format(message, args):
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError):
+        return f"{message} {args}"
+
+def _log(level_name, level, message, args, always):
+    _ring.append((time.time(), level_name, message, args))
+    if always or debug_enabled():
+        xbmc.log(LOG_PREFIX + _format(message, args), level)
+
+def debug(message, *args):
+    """Detail only written to kodi.log with the debug setting, otherwise just buffered"""
+    _log("DEBUG", xbmc.LOGINFO, message, args, False)
+
+def info(message, *args):
+    _log("INFO", xbmc.LOGINFO, message, args, True)
+
+def warning(message, *args):
+    _log("WARNING", xbmc.LOGWARNING, message, args, True)
+
+def error(message, *args):
+    """Log an error and save the buffer so the lead-up can be inspected later"""
+    global _failed
+    _log("ERROR", xbmc.LOGERROR, message, args, True)
+    _failed = True
+    save_buffer()
+
+def _buffer_file(role):
+    return os.path.join(get_cache_path(), DEBUG_LOG_DIR, f"{role}.log")
+
+def format_buffer():
+    lines = []
+    for logged, level_name, message, args in list(_ring):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(logged))
+        lines.append(f"{timestamp}.{int(logged * 1000) % 1000:03d} {level_name:<7} {_format(message, args)}")
+    return "\n".join(lines)
+
+def save_buffer(name=None):
+    """Write this process's buffer to its debug log or the one called name, replacing the last one"""
+    path = _buffer_file(name or _role)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(format_buffer() + "\n")
+    except OSError as e:
+        xbmc.log(f"{LOG_PREFIX}Failed to save debug log: {e}", xbmc.LOGWARNING)
+
+def flush():
+    """Save the buffer at the end of an invocation that failed, so it has the whole story"""
+    if _failed:
+        save_buffer()
+
+def saved_buffers():
+    """Get {role: text} of the buffers saved after the last failures and the live service one"""
+    buffers = {}
+    for role in ("plugin", "service", LIVE_SERVICE_LOG):
+        try:
+            with open(_buffer_file(role), 'r', encoding='utf-8') as f:
+                buffers[role] = f.read()
+        except OSError:
+            pass
+    return buffers
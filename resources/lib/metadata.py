@@ -0,0 +1,82 @@
+# General python libs
+import threading, time
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, manager_type
+from resources.lib.store import set_lookup, get_lookup, prune_lookups
+
+# Lookup endpoint, its argument for an external ID and the external ID field,
+# movies are looked up directly, series by search term
+LOOKUP_ENDPOINTS = {"Radarr": ("movie/lookup/tmdb", "tmdbId={}", "tmdbId"), "Sonarr": ("series/lookup", "term=tvdb:{}", "tvdbId")}
+# Fields of a lookup result that go into the add request
+PAYLOAD_FIELDS = {
+    "Radarr": ("title", "originalTitle", "sortTitle", "year", "titleSlug", "images", "tmdbId", "imdbId", "runtime", "genres"),
+    "Sonarr": ("title", "sortTitle", "year", "titleSlug", "images", "tvdbId", "imdbId", "tvRageId", "tvMazeId", "seriesType", "seasons", "genres")
+}
+# Lookup results are used for this long (seconds), new seasons show up in between
+METADATA_MAX_AGE = 7 * 24 * 60 * 60
+
+# Lookups running in this process
+_fetching = set()
+_fetching_lock = threading.Lock()
+
+
+def get_metadata(manager, external_id):
+    """Get the cached lookup result of an item or None, never asks the server"""
+    entry = get_lookup(manager_type(manager), external_id)
+    if entry and time.time() - entry[1] < METADATA_MAX_AGE:
+        return entry[0]
+    return None
+
+def get_title(manager, external_id):
+    """Get the real title of an item if it was looked up before"""
+    return (get_metadata(manager, external_id) or {}).get("title")
+
+def fetch_metadata(manager, external_id):
+    """Look up an item on the server and cache the fields an add needs, returns them or None"""
+    kind = manager_type(manager)
+    api_path, argument, external_field = LOOKUP_ENDPOINTS[kind]
+    status, response = arr_get(manager, api_path, argument.format(external_id))
+    if not status:
+        log.warning("Failed to look up %s in %s: %s", external_id, manager, log.Payload(response))
+        return None
+
+    try:
+        items = response.json()
+    except ValueError:
+        items = None
+    if isinstance(items, dict):
+        items = [items]
+    for item in items or []:
+        if str(item.get(external_field)) == str(external_id):
+            data = {field: item[field] for field in PAYLOAD_FIELDS[kind] if item.get(field) is not None}
+            set_lookup(kind, external_id, data, time.time())
+            log.debug("Cached %s lookup of %s: %s", manager, external_id, data.get("title"))
+            return data
+    log.warning("%s lookup found nothing for %s", manager, external_id)
+    return None
+
+def _fetch(manager, external_id):
+    try:
+        fetch_metadata(manager, external_id)
+    except Exception as e:
+        log.error("Background lookup of %s %s failed: %s", manager, external_id, e)
+    finally:
+        with _fetching_lock:
+            _fetching.discard((manager_type(manager), str(external_id)))
+
+def prefetch_metadata(manager, external_id):
+    """Look up an item in a background thread unless it is cached or already being looked up"""
+    if get_metadata(manager, external_id):
+        return
+    key = (manager_type(manager), str(external_id))
+    with _fetching_lock:
+        if key in _fetching:
+            return
+        _fetching.add(key)
+    threading.Thread(target=_fetch, args=(manager, external_id), name=f"lookup_{manager}_{external_id}", daemon=True).start()
+
+def prune_metadata():
+    """Drop lookup results too old to be used"""
+    prune_lookups(time.time() - METADATA_MAX_AGE)
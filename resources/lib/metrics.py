@@ -0,0 +1,90 @@
+# General python libs
+import json, threading, time
+from contextlib import contextmanager
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.store import add_metrics, get_metrics
+
+# Samples kept per phase and manager
+METRICS_SAMPLES = 500
+# Samples older than this (seconds) are left out of the summary
+METRICS_MAX_AGE = 30 * 24 * 60 * 60
+# Percentiles of the summary
+PERCENTILES = (50, 95, 99)
+
+# Samples not stored yet, written together by flush()
+_pending = []
+_pending_lock = threading.Lock()
+
+
+def record(phase, manager, seconds):
+    """Keep a latency sample until the next flush()"""
+    with _pending_lock:
+        _pending.append((phase, manager or "", seconds, time.time()))
+
+def flush():
+    """Store the recorded samples in one transaction, metrics never break the invocation measured
+
+    The plugin flushes once at its end and the service once per loop, so
+    the spans of a run don't each take the database write lock.
+    """
+    global _pending
+    with _pending_lock:
+        samples, _pending = _pending, []
+    if not samples:
+        return
+    try:
+        add_metrics(samples, METRICS_SAMPLES)
+    except Exception as e:
+        log.warning("Failed to store %s metrics: %s", len(samples), e)
+
+@contextmanager
+def span(phase, manager=""):
+    """Time the enclosed block as a phase of the invocation
+
+    Phases are e.g. "settings", "rootfolder", "profile", "add", "search",
+    "poll" and "dialog", so the summary shows whether time goes to Kodi, the network
+    or the user.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, manager, time.perf_counter() - started)
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of sorted samples"""
+    index = max(0, -(-len(samples) * percent // 100) - 1)
+    return samples[min(index, len(samples) - 1)]
+
+def summarize():
+    """Get [{"phase", "manager", "count", "p50", "p95", "p99", "max"}] of the recent samples"""
+    flush()
+    summary = []
+    for (phase, manager), samples in sorted(get_metrics(time.time() - METRICS_MAX_AGE).items()):
+        samples.sort()
+        entry = {"phase": phase, "manager": manager, "count": len(samples)}
+        for percent in PERCENTILES:
+            entry[f"p{percent}"] = percentile(samples, percent)
+        entry["max"] = samples[-1]
+        summary.append(entry)
+    return summary
+
+def _format_seconds(seconds):
+    return f"{seconds * 1000:.0f} ms" if seconds < 10 else f"{seconds:.1f} s"
+
+def format_summary(summary):
+    """Format a summary as text lines for a dialog"""
+    if not summary:
+        return "No measurements yet."
+    lines = []
+    for entry in summary:
+        name = f"{entry['manager']} {entry['phase']}" if entry["manager"] else entry["phase"]
+        values = "  ".join(f"p{percent} {_format_seconds(entry[f'p{percent}'])}" for percent in PERCENTILES)
+        lines.append(f"{name} ({entry['count']}x): {values}  max {_format_seconds(entry['max'])}")
+    return "\n".join(lines)
+
+def export_summary(summary):
+    """Serialize a summary for sharing, e.g. in a bug report"""
+    return json.dumps({"exported": time.time(), "unit": "seconds", "phases": summary}, indent=2)
@@ -0,0 +1,488 @@
+# General python libs
+import json, threading, time
+
+# Kodi libs
+import xbmcgui, xbmcaddon, xbmc
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, probe_manager, configured_instances, manager_type
+from resources.lib.signalr import SignalRListener
+from resources.lib.reference import refresh_stale_references, REFERENCE_CHECK_INTERVAL
+from resources.lib.metrics import span, flush as flush_metrics
+from resources.lib.journal import replay_journal, next_attempt
+from resources.lib.library import library_lookup
+from resources.lib.metadata import prefetch_metadata, prune_metadata
+from resources.lib.downloads import DownloadTracker
+from resources.lib.widgets import WidgetRefresher
+from resources.lib.durations import estimate_duration, record_duration, next_poll_delay, parse_duration
+
+ADDON_ID = "plugin.module.helparr"
+# Home window, its properties are shared between all add-on processes
+HOME_WINDOW_ID = 10000
+# Notification method used to hand commands from the plugin to the service
+MONITOR_METHOD = "helparr.monitor"
+# Notification method telling the service that add requests were journaled
+JOURNAL_METHOD = "helparr.journal"
+# Notification method handing the content of a completed search to download tracking
+TRACK_METHOD = "helparr.track"
+# Notification method telling the service that widget feeds of a manager changed
+WIDGETS_METHOD = "helparr.widgets"
+# Notification method asking the service to save its live log buffer
+DUMP_LOG_METHOD = "helparr.dumplog"
+# Window property with the time the service last saved its live log buffer
+DUMP_LOG_PROPERTY = "helparr.service.dumped"
+# How long the plugin waits for the service to save it (seconds)
+DUMP_LOG_TIMEOUT = 5
+# Window property the service refreshes from its own thread to show it is alive
+HEARTBEAT_PROPERTY = "helparr.service.heartbeat"
+HEARTBEAT_INTERVAL = 1
+# Well above a request with the longest timeouts the settings allow (15s
+# connect, 30s read), nothing the service waits for may make it look dead
+HEARTBEAT_TIMEOUT = 60
+# Commands are monitored for up to 5 minutes
+COMMAND_TIMEOUT = 5 * 60
+# Final command states are kept this long for plugin dialogs to pick them up
+FINAL_STATUS_LIFETIME = 60
+# How long to look for the search command an add request started (seconds)
+SEARCH_DISCOVERY_TIMEOUT = 30
+# Names of the search command the add options start and its content ID field,
+# Sonarr queues a MissingEpisodeSearch for searchForMissingEpisodes
+ADD_SEARCH_COMMANDS = {"Radarr": (("MoviesSearch",), "movieIds"), "Sonarr": (("MissingEpisodeSearch", "SeriesSearch"), "seriesId")}
+# With push updates a manager is still polled this often to catch lost messages
+PUSH_SAFETY_POLL_INTERVAL = 60
+# Manager and unique ID of focused list items whose metadata is prefetched
+FOCUS_TYPES = {"movie": ("Radarr", "tmdb"), "tvshow": ("Sonarr", "tvdb")}
+
+
+def _status_property(manager, command_id):
+    return f"helparr.command.{manager}.{command_id}"
+
+def service_is_running():
+    """Check if the background service is alive by its heartbeat"""
+    heartbeat = xbmcgui.Window(HOME_WINDOW_ID).getProperty(HEARTBEAT_PROPERTY)
+    try:
+        return time.time() - float(heartbeat) < HEARTBEAT_TIMEOUT
+    except ValueError:
+        return False
+
+def _notify_service(method, data):
+    request = {
+        "jsonrpc": "2.0",
+        "method": "JSONRPC.NotifyAll",
+        "params": {"sender": ADDON_ID, "message": method, "data": data},
+        "id": 1
+    }
+    xbmc.executeJSONRPC(json.dumps(request))
+
+def hand_off_command(manager, command_id, content_title, command_name=""):
+    """Let the background service monitor a command, returns False if it is not running"""
+    if not service_is_running():
+        log.debug("Background service not running, monitoring in plugin")
+        return False
+    
+    _notify_service(MONITOR_METHOD, {"manager": manager, "id": command_id, "title": content_title, "name": command_name})
+    log.debug("Handed %s command %s to background service", manager, command_id)
+    return True
+
+def wake_journal():
+    """Let the background service replay the journal right away"""
+    _notify_service(JOURNAL_METHOD, {})
+
+def dump_service_log():
+    """Ask the background service to save its live log buffer, returns False if it did not"""
+    if not service_is_running():
+        return False
+    window = xbmcgui.Window(HOME_WINDOW_ID)
+    requested = time.time()
+    _notify_service(DUMP_LOG_METHOD, {})
+    while time.time() - requested < DUMP_LOG_TIMEOUT:
+        try:
+            if float(window.getProperty(DUMP_LOG_PROPERTY)) >= requested:
+                return True
+        except ValueError:
+            pass
+        xbmc.sleep(100)
+    log.warning("Background service did not save its log buffer")
+    return False
+
+def invalidate_widgets(manager, feeds=None):
+    """Ask the service to refresh widget feeds of a manager, e.g. after adding content"""
+    _notify_service(WIDGETS_METHOD, {"manager": manager, "feeds": feeds})
+
+def get_command_status(manager, command_id):
+    """Get the last command data published by the background service or None"""
+    value = xbmcgui.Window(HOME_WINDOW_ID).getProperty(_status_property(manager, command_id))
+    return json.loads(value) if value else None
+
+def find_search_command(manager, content_id):
+    """Find the search command the server started for added content or None"""
+    command_names, id_field = ADD_SEARCH_COMMANDS[manager_type(manager)]
+    status, response = arr_get(manager, "command", "")
+    if not status:
+        return None
+    
+    matches = []
+    for command in response.json():
+        if command.get("name") not in command_names:
+            continue
+        ids = command.get("body", {}).get(id_field)
+        if ids == content_id or (isinstance(ids, list) and content_id in ids):
+            matches.append(command)
+    return max(matches, key=lambda command: command.get("id", 0)) if matches else None
+
+def wait_for_search_command(manager, content_id):
+    """Wait for the server to start the search after adding content
+
+    The search only starts once the server refreshed the new item's
+    metadata, so it may take a moment to appear.
+    """
+    waited = 0
+    while waited < SEARCH_DISCOVERY_TIMEOUT:
+        command = find_search_command(manager, content_id)
+        if command:
+            log.debug("Found %s search command %s for %s", manager, command.get('id'), content_id)
+            return command
+        xbmc.sleep(2000)
+        waited += 2
+    log.warning("No %s search command found for %s", manager, content_id)
+    return None
+
+def check_content_status(manager, content_title, command_data):
+    """Let the background service follow the searched content until it is imported
+
+    Returns False if the service is not running, a plugin invocation doesn't
+    live long enough to follow a download.
+    """
+    log.debug("Search completed for %s in %s", content_title, manager)
+    if not service_is_running():
+        log.debug("Background service not running, not tracking downloads")
+        return False
+    _notify_service(TRACK_METHOD, {"manager": manager, "title": content_title, "command": {"body": command_data.get("body", {})}})
+    return True
+
+class CommandScheduler(xbmc.Monitor):
+    """Long-lived monitor for the commands of all plugin invocations
+
+    Every tick each manager with outstanding commands is asked for its whole
+    command list once, no matter how many searches are in flight. Each command
+    is polled on its own schedule from the learned duration of its kind and
+    a manager is only asked when one of its commands is due. With push
+    updates enabled the managers' SignalR feeds resolve commands right away
+    and polling only runs as a rare safety net or while the feed is down.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.window = xbmcgui.Window(HOME_WINDOW_ID)
+        # {(manager, command ID): {"title": ..., "started": ...}}
+        self.commands = {}
+        # [(expiry, window property)] of final states to clear later
+        self.expiring = []
+        # Commands are updated from the SignalR listener threads as well
+        self.lock = threading.RLock()
+        # {manager: SignalRListener}
+        self.listeners = {}
+        # {manager: time of the last poll}
+        self.last_poll = {}
+        # Reference data is kept warm so plugin invocations never wait for it
+        self.last_reference_check = 0
+        # Time the next journaled add request is due, checked once on start
+        self.journal_due = 0
+        self.journal_thread = None
+        # Widget feeds in use, refreshed when due or when their content changed
+        self.widgets = WidgetRefresher()
+        # Downloads of searched content, followed after their command completed
+        self.downloads = DownloadTracker(self.widgets.invalidate)
+        # (manager, external ID) of the focused list item on the last loop and the last one looked up
+        self.focused = None
+        self.prefetched = None
+        # Probes of unhealthy managers, they may hang until their timeout
+        self.probe_thread = None
+        # Set when the service stops, ends the heartbeat
+        self.stopped = threading.Event()
+    
+    def onNotification(self, sender, method, data):
+        if sender != ADDON_ID:
+            return
+        if method.endswith(JOURNAL_METHOD):
+            self.journal_due = 0
+            return
+        if method.endswith(DUMP_LOG_METHOD):
+            log.save_buffer(log.LIVE_SERVICE_LOG)
+            self.window.setProperty(DUMP_LOG_PROPERTY, str(time.time()))
+            return
+        if method.endswith(WIDGETS_METHOD):
+            try:
+                request = json.loads(data)
+                self.widgets.invalidate(request["manager"], request.get("feeds"))
+            except (ValueError, KeyError, TypeError) as e:
+                log.error("Invalid widget request %s: %s", log.Payload(data), e)
+            return
+        if method.endswith(TRACK_METHOD):
+            try:
+                request = json.loads(data)
+                self.downloads.track(request["manager"], request.get("title", "content"), request["command"])
+            except (ValueError, KeyError, TypeError) as e:
+                log.error("Invalid tracking request %s: %s", log.Payload(data), e)
+            return
+        if not method.endswith(MONITOR_METHOD):
+            return
+        try:
+            command = json.loads(data)
+            manager, command_id = command["manager"], int(command["id"])
+        except (ValueError, KeyError, TypeError) as e:
+            log.error("Invalid monitor request %s: %s", log.Payload(data), e)
+            return
+        self.register_command(manager, command_id, command.get("title", "content"), command.get("name", ""))
+    
+    def register_command(self, manager, command_id, content_title, command_name=""):
+        key = (manager, command_id)
+        log.debug("Service monitoring %s command %s", manager, command_id)
+        estimate = estimate_duration(manager, command_name)
+        now = time.time()
+        with self.lock:
+            self.commands[key] = {
+                "title": content_title,
+                "name": command_name,
+                "started": now,
+                "estimate": estimate,
+                "polls": 0,
+                # Without an estimate poll soon after a new command arrives
+                "next_poll": now + (next_poll_delay(0, estimate, 0, self.interval()) if estimate else 1)
+            }
+    
+    def heartbeat(self):
+        """Refresh the heartbeat until the service stops, the loop may block on requests"""
+        while True:
+            self.window.setProperty(HEARTBEAT_PROPERTY, str(time.time()))
+            if self.stopped.wait(HEARTBEAT_INTERVAL):
+                break
+    
+    def probe_managers(self):
+        """Probe unhealthy managers in a thread unless the last probes still run"""
+        if self.probe_thread and self.probe_thread.is_alive():
+            return
+        
+        def probe():
+            for manager in configured_instances():
+                try:
+                    probe_manager(manager)
+                except Exception as e:
+                    log.error("Probing %s failed: %s", manager, e)
+        
+        self.probe_thread = threading.Thread(target=probe, name="probe_managers", daemon=True)
+        self.probe_thread.start()
+    
+    def run(self):
+        log.info("Background service started")
+        heartbeat = threading.Thread(target=self.heartbeat, name="heartbeat", daemon=True)
+        heartbeat.start()
+        while not self.abortRequested():
+            now = time.time()
+            self.step("probes", self.probe_managers)
+            self.step("listeners", self.update_listeners)
+            if now - self.last_reference_check >= REFERENCE_CHECK_INTERVAL:
+                self.last_reference_check = now
+                self.step("references", refresh_stale_references)
+                self.step("metadata", prune_metadata)
+            self.step("prefetch", self.prefetch_focused)
+            if now >= self.journal_due:
+                self.step("journal", self.replay_journal)
+            if self.commands:
+                self.step("commands", self.tick)
+            if self.downloads.items:
+                self.step("downloads", self.downloads.tick, now)
+            self.step("widgets", self.widgets.tick, now)
+            self.step("statuses", self.clear_expired, now)
+            self.step("metrics", flush_metrics)
+            if self.waitForAbort(1):
+                break
+        for listener in self.listeners.values():
+            listener.stop()
+        self.stopped.set()
+        heartbeat.join()
+        self.window.clearProperty(HEARTBEAT_PROPERTY)
+        flush_metrics()
+        log.info("Background service stopped")
+    
+    def step(self, name, function, *args):
+        """Run one step of the loop, a failing step must not stop the service"""
+        try:
+            function(*args)
+        except Exception as e:
+            log.error("Service step %s failed: %s", name, e)
+    
+    def replay_journal(self):
+        """Replay due add requests in a thread, the loop must keep its heartbeat"""
+        if self.journal_thread and self.journal_thread.is_alive():
+            return
+        
+        def replay():
+            try:
+                for manager in replay_journal(self.register_command):
+                    self.widgets.invalidate(manager, ["upcoming"])
+            except Exception as e:
+                log.error("Journal replay failed: %s", e)
+            finally:
+                due = next_attempt()
+                self.journal_due = due if due is not None else float("inf")
+        
+        # Nothing is due until the replay finished and set the next time
+        self.journal_due = float("inf")
+        self.journal_thread = threading.Thread(target=replay, name="journal_replay", daemon=True)
+        self.journal_thread.start()
+    
+    def prefetch_focused(self):
+        """Look up the focused movie or show once it stayed focused for a loop
+
+        Browsing e.g. TMDb Helper lists warms the metadata cache this way,
+        so adding the item later sends a complete request right away.
+        """
+        manager, unique_id = FOCUS_TYPES.get(xbmc.getInfoLabel("ListItem.DBType"), (None, None))
+        if manager is None:
+            self.focused = None
+            return
+        external_id = xbmc.getInfoLabel(f"ListItem.UniqueID({unique_id})") or xbmc.getInfoLabel(f"ListItem.Property({unique_id}_id)")
+        focused, self.focused = self.focused, (manager, external_id)
+        # Scrolling through a list only looks up where the user stops
+        if focused != self.focused or self.focused == self.prefetched or not external_id.isdigit():
+            return
+        self.prefetched = self.focused
+        instances = configured_instances(manager)
+        if instances and not library_lookup(instances[0], external_id):
+            prefetch_metadata(instances[0], external_id)
+    
+    def interval(self):
+        try:
+            return int(xbmcaddon.Addon().getSetting("progress_interval"))
+        except ValueError:
+            return 5
+    
+    def managers(self):
+        with self.lock:
+            return {manager for manager, _ in self.commands}
+    
+    def update_listeners(self):
+        """Start push listeners for managers with outstanding commands"""
+        if xbmcaddon.Addon().getSetting("push_updates") != "true":
+            for listener in self.listeners.values():
+                listener.stop()
+            self.listeners = {}
+            return
+        
+        for manager in self.managers():
+            listener = self.listeners.get(manager)
+            if listener is None or not listener.is_alive():
+                listener = SignalRListener(manager, self.on_command)
+                listener.start()
+                self.listeners[manager] = listener
+    
+    def on_command(self, manager, command_data):
+        with self.lock:
+            key = (manager, command_data.get("id"))
+            if key in self.commands:
+                self.update_command(manager, key[1], command_data)
+    
+    def tick(self):
+        now = time.time()
+        for manager in self.managers():
+            listener = self.listeners.get(manager)
+            if listener and listener.connected.is_set():
+                if now - self.last_poll.get(manager, 0) < PUSH_SAFETY_POLL_INTERVAL:
+                    continue
+            else:
+                with self.lock:
+                    # Push updates may have finished the commands since managers() was called
+                    next_poll = min((command["next_poll"] for key, command in self.commands.items() if key[0] == manager), default=None)
+                if next_poll is None or now < next_poll:
+                    continue
+            self.last_poll[manager] = now
+            with self.lock:
+                self.poll_manager(manager)
+                self.reschedule(manager)
+    
+    def reschedule(self, manager):
+        now = time.time()
+        interval = self.interval()
+        for key, command in self.commands.items():
+            if key[0] == manager:
+                command["polls"] += 1
+                command["next_poll"] = now + next_poll_delay(now - command["started"], command["estimate"], command["polls"], interval)
+    
+    def poll_manager(self, manager):
+        command_ids = [command_id for key_manager, command_id in list(self.commands) if key_manager == manager]
+        with span("poll", manager):
+            status, response = arr_get(manager, "command", "")
+        found = {}
+        if status:
+            try:
+                found = {command.get("id"): command for command in response.json() if command.get("id") in command_ids}
+            except (ValueError, AttributeError) as e:
+                # E.g. a proxy answering with an HTML page
+                status, response = False, e
+        if not status:
+            log.warning("Failed to poll %s commands: %s", manager, log.Payload(response))
+        
+        for command_id in command_ids:
+            command_data = found.get(command_id)
+            if command_data is None and status:
+                # Finished commands eventually drop out of the list
+                single_status, single_response = arr_get(manager, f"command/{command_id}", "")
+                if single_status:
+                    try:
+                        command_data = single_response.json()
+                    except ValueError as e:
+                        log.warning("Invalid %s command %s: %s", manager, command_id, e)
+            self.update_command(manager, command_id, command_data)
+    
+    def update_command(self, manager, command_id, command_data):
+        key = (manager, command_id)
+        content_title = self.commands[key]["title"]
+        
+        if command_data is not None:
+            self.window.setProperty(_status_property(manager, command_id), json.dumps({
+                "status": command_data.get("status", "unknown"),
+                "commandName": command_data.get("commandName", "Search")
+            }))
+            command_status = command_data.get("status", "unknown")
+            log.debug("Command %s status: %s", command_id, command_status)
+            
+            if command_status == 'completed':
+                xbmcgui.Dialog().notification(
+                    "Helparr", 
+                    f"Search completed for '{content_title}'", 
+                    xbmcgui.NOTIFICATION_INFO, 
+                    3000
+                )
+                duration = parse_duration(command_data.get("duration")) or time.time() - self.commands[key]["started"]
+                record_duration(manager, command_data.get("name") or self.commands[key]["name"], duration)
+                self.downloads.track(manager, content_title, command_data)
+                self.finish(key)
+                return
+            elif command_status == 'failed':
+                xbmcgui.Dialog().notification(
+                    "Helparr", 
+                    f"Search failed for '{content_title}'", 
+                    xbmcgui.NOTIFICATION_ERROR, 
+                    5000
+                )
+                self.finish(key)
+                return
+        
+        if time.time() - self.commands[key]["started"] > COMMAND_TIMEOUT:
+            xbmcgui.Dialog().notification(
+                "Helparr", 
+                f"Progress monitoring timed out for '{content_title}'", 
+                xbmcgui.NOTIFICATION_WARNING, 
+                3000
+            )
+            self.finish(key)
+    
+    def finish(self, key):
+        del self.commands[key]
+        self.expiring.append((time.time() + FINAL_STATUS_LIFETIME, _status_property(*key)))
+    
+    def clear_expired(self, now):
+        while self.expiring and self.expiring[0][0] <= now:
+            self.window.clearProperty(self.expiring.pop(0)[1])
@@ -0,0 +1,134 @@
+# General python libs
+import hashlib, threading, time
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, configured_instances, manager_type
+from resources.lib.singleflight import SingleFlight
+from resources.lib.store import get_meta, set_meta, replace_profiles, get_profiles, replace_root_folders, get_root_folders, replace_tags, get_tags
+
+# Reference endpoints of each manager and the time (seconds) after which they
+# are revalidated in the background, root folders change with their free space
+REFERENCE_TTLS = {
+    "Radarr": {"qualityprofile": 6 * 60 * 60, "rootfolder": 15 * 60, "tag": 6 * 60 * 60},
+    "Sonarr": {"qualityprofile": 6 * 60 * 60, "rootfolder": 15 * 60, "tag": 6 * 60 * 60, "languageprofile": 24 * 60 * 60}
+}
+# Age (seconds) after which cached reference data is not used anymore
+REFERENCE_MAX_AGE = 2 * 24 * 60 * 60
+# Interval (seconds) in which the background service looks for stale data
+REFERENCE_CHECK_INTERVAL = 60
+
+# Endpoints with their own table, the others are kept as a whole in the meta table
+_TABLES = {
+    "qualityprofile": (replace_profiles, get_profiles),
+    "rootfolder": (replace_root_folders, get_root_folders),
+    "tag": (replace_tags, get_tags)
+}
+
+# Background refreshes running in this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _key(manager, endpoint):
+    return f"reference.{manager}.{endpoint}"
+
+def _store_data(manager, endpoint, data):
+    if endpoint in _TABLES:
+        _TABLES[endpoint][0](manager, data)
+        return None
+    return data
+
+def _load_data(manager, endpoint, entry):
+    if endpoint in _TABLES:
+        return _TABLES[endpoint][1](manager)
+    return entry.get("data", [])
+
+def revalidate(manager, endpoint, force=False):
+    """Fetch reference data if it changed on the server, returns success
+
+    Servers sending an ETag are asked with If-None-Match and may answer 304
+    without a body, for the others the body is hashed so that unchanged data
+    is not written again.
+    """
+    entry = get_meta(_key(manager, endpoint)) or {}
+    headers = {"If-None-Match": entry["etag"]} if entry.get("etag") and not force else None
+
+    status, response = arr_get(manager, endpoint, "", headers)
+    if not status:
+        log.warning("Failed to revalidate %s %s: %s", manager, endpoint, log.Payload(response))
+        return False
+
+    if response.status_code == 304:
+        log.debug("%s %s not modified", manager, endpoint)
+    else:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, list):
+            log.error("Unexpected %s %s response", manager, endpoint)
+            return False
+
+        digest = hashlib.sha1(response.content).hexdigest()
+        if force or digest != entry.get("hash"):
+            log.debug("Storing %s %s %s items", len(data), manager, endpoint)
+            entry["data"] = _store_data(manager, endpoint, data)
+        entry["hash"] = digest
+        entry["etag"] = response.headers.get("ETag")
+
+    entry["validated"] = time.time()
+    set_meta(_key(manager, endpoint), entry)
+    return True
+
+def _refresh(manager, endpoint):
+    # Plugin invocations and the service must not refresh the same data at once
+    flight = SingleFlight(f"{manager}.{endpoint}", lease_timeout=60)
+    try:
+        if flight.acquire():
+            revalidate(manager, endpoint)
+    except Exception as e:
+        log.error("Background refresh of %s %s failed: %s", manager, endpoint, e)
+    finally:
+        flight.release()
+        with _refreshing_lock:
+            _refreshing.discard((manager, endpoint))
+
+def refresh_in_background(manager, endpoint):
+    """Revalidate reference data in a background thread unless already running"""
+    with _refreshing_lock:
+        if (manager, endpoint) in _refreshing:
+            return
+        _refreshing.add((manager, endpoint))
+    threading.Thread(target=_refresh, args=(manager, endpoint), name=f"refresh_{manager}_{endpoint}", daemon=True).start()
+
+def get_reference(manager, endpoint):
+    """Get reference data of a manager without waiting for the server if possible
+
+    Stale data is returned right away while it is revalidated in the
+    background. Only when nothing usable is cached, either because there
+    never was anything or it is older than REFERENCE_MAX_AGE, the server is
+    asked directly. Returns an empty list if that fails.
+    """
+    entry = get_meta(_key(manager, endpoint))
+    age = time.time() - entry["validated"] if entry else None
+
+    if age is None or age > REFERENCE_MAX_AGE:
+        log.debug("No usable %s %s cached, fetching", manager, endpoint)
+        if not revalidate(manager, endpoint):
+            return []
+        entry = get_meta(_key(manager, endpoint))
+    elif age > REFERENCE_TTLS[manager_type(manager)][endpoint]:
+        log.debug("%s %s is %ss old, refreshing in background", manager, endpoint, int(age))
+        refresh_in_background(manager, endpoint)
+
+    return _load_data(manager, endpoint, entry)
+
+def refresh_stale_references():
+    """Start background refreshes for all reference data past its TTL"""
+    now = time.time()
+    for manager in configured_instances():
+        for endpoint, ttl in REFERENCE_TTLS[manager_type(manager)].items():
+            entry = get_meta(_key(manager, endpoint))
+            if not entry or now - entry["validated"] > ttl:
+                refresh_in_background(manager, endpoint)
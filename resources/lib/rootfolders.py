@@ -0,0 +1,88 @@
+# Kodi libs
+import xbmcaddon
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import manager_type, INSTANCES, MANAGERS
+from resources.lib.reference import get_reference
+from resources.lib.store import increment_meta
+
+# Policies of the <manager>_folder_policy setting, by index
+FOLDER_POLICIES = ["Setting", "MostFree", "RoundRobin", "Fill"]
+
+GIGABYTE = 1024 ** 3
+# Rough size of a new item, what a folder is expected to lose per item
+# when a batch is spread over the folders
+ITEM_SIZE_ESTIMATES = {"Radarr": 10 * GIGABYTE, "Sonarr": 50 * GIGABYTE}
+
+
+def get_folder_policy(manager):
+    """Get the root folder policy of a manager as Setting, MostFree, RoundRobin or Fill"""
+    try:
+        return FOLDER_POLICIES[int(xbmcaddon.Addon().getSetting(f"{MANAGERS[manager_type(manager)]}_folder_policy"))]
+    except (ValueError, IndexError):
+        return "Setting"
+
+def get_min_free(manager):
+    """Get the free space (bytes) a root folder must keep to get new items"""
+    try:
+        return int(float(xbmcaddon.Addon().getSetting(f"{MANAGERS[manager_type(manager)]}_min_free"))) * GIGABYTE
+    except ValueError:
+        return 0
+
+def _same_path(path, other):
+    return path.rstrip("/\\") == other.rstrip("/\\")
+
+def _candidates(folders, directory):
+    """Root folders the server can write to, the one from the settings first"""
+    usable = [folder for folder in folders if folder.get("path") and folder.get("accessible", True) and folder.get("freeSpace") is not None]
+    return sorted(usable, key=lambda folder: not _same_path(folder["path"], directory))
+
+def _pick(instance, policy, folders, min_free):
+    roomy = [folder for folder in folders if folder["freeSpace"] >= min_free]
+    if not roomy:
+        log.warning("All %s root folders have less than %sGB free", instance, min_free // GIGABYTE)
+        roomy, policy = folders, "MostFree"
+
+    if policy == "MostFree":
+        folder = max(roomy, key=lambda folder: folder["freeSpace"])
+    elif policy == "RoundRobin":
+        folder = roomy[increment_meta(f"rootfolder.{instance}.next") % len(roomy)]
+    else:
+        # Fill the folders one after the other
+        folder = roomy[0]
+    log.debug("%s root folder by %s: %s (%sGB free)", instance, policy, folder["path"], folder["freeSpace"] // GIGABYTE)
+    return folder
+
+def choose_root_folders(instance, count):
+    """Get the root folders for count new items of an instance, "" for each if there is none
+
+    The folders and their free space come from the cached root folder
+    snapshot that the service keeps fresh, so choosing costs no request.
+    Folders with less than the minimum free space are skipped, if all of
+    them are that full the one with the most space left is used. Every
+    item placed takes its estimated size off the free space of its folder,
+    so a batch moves on to the next folder as the first one fills up.
+    Without a snapshot the folder from the settings is used.
+    """
+    directory = xbmcaddon.Addon().getSetting(f"{INSTANCES[instance]}_dir")
+    policy = get_folder_policy(instance)
+    if policy == "Setting":
+        return [directory] * count
+
+    folders = [dict(folder) for folder in _candidates(get_reference(instance, "rootfolder"), directory)]
+    if not folders:
+        log.warning("No usable %s root folders cached, using '%s'", instance, directory)
+        return [directory] * count
+    min_free = get_min_free(instance)
+    item_size = ITEM_SIZE_ESTIMATES[manager_type(instance)]
+    paths = []
+    for _ in range(count):
+        folder = _pick(instance, policy, folders, min_free)
+        folder["freeSpace"] -= item_size
+        paths.append(folder["path"])
+    return paths
+
+def choose_root_folder(instance):
+    """Get the root folder for a new item of an instance, "" if there is none"""
+    return choose_root_folders(instance, 1)[0]
@@ -0,0 +1,68 @@
+# Kodi libs
+import xbmcaddon
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import configured_instances, INSTANCES, MANAGERS
+from resources.lib.metadata import get_metadata, fetch_metadata
+
+# Routing modes of the <manager>_routing setting, by index
+ROUTING_MODES = ["Primary", "All", "Ask", "Profile"]
+
+
+def get_routing_mode(manager):
+    """Get the routing setting of a manager as Primary, All, Ask or Profile"""
+    try:
+        return ROUTING_MODES[int(xbmcaddon.Addon().getSetting(f"{MANAGERS[manager]}_routing"))]
+    except (ValueError, IndexError):
+        return "Primary"
+
+def parse_genres(value):
+    """Split a comma separated genre list or a list of genres into a set of lower case names"""
+    if isinstance(value, (list, tuple)):
+        value = ",".join(value)
+    return {genre.strip().lower() for genre in (value or "").split(",") if genre.strip()}
+
+def instance_genres(instance):
+    return parse_genres(xbmcaddon.Addon().getSetting(f"{INSTANCES[instance]}_genres"))
+
+def item_genres(manager, external_id):
+    """Get the genres of an item from its lookup, looking it up if it is not cached"""
+    metadata = get_metadata(manager, external_id)
+    if not metadata or "genres" not in metadata:
+        # Lookups cached before genres were kept don't have them
+        metadata = fetch_metadata(manager, external_id) or {}
+    return metadata.get("genres")
+
+def route(manager, genres=None, external_id=None):
+    """Get (instances, choice) for an add to a manager
+
+    Instances with genres set only get items of those genres, and they get
+    them exclusively, the genres of the lookup of external_id are used when
+    none are passed. Everything else goes to the instances without genres
+    as the routing setting says: the first one, all of them or the ones the
+    user picks. In the last case choice is "Ask" to pick instances or
+    "Profile" to pick quality profiles of them, and the instances are the
+    choices, otherwise it is None.
+    """
+    instances = configured_instances(manager)
+    if len(instances) <= 1:
+        return instances or [manager], None
+
+    if not genres and external_id and any(instance_genres(instance) for instance in instances):
+        genres = item_genres(manager, external_id)
+    genres = parse_genres(genres)
+    if genres:
+        matched = [instance for instance in instances if instance_genres(instance) & genres]
+        if matched:
+            log.debug("%s instances for genres %s: %s", manager, genres, matched)
+            return matched, None
+    general = [instance for instance in instances if not instance_genres(instance)] or instances[:1]
+
+    mode = get_routing_mode(manager)
+    log.debug("%s routing mode %s, instances %s", manager, mode, general)
+    if mode == "All":
+        return general, None
+    if mode == "Profile" or (mode == "Ask" and len(general) > 1):
+        return general, mode
+    return general[:1], None
@@ -0,0 +1,127 @@
+# General python libs
+import json, threading
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import get_client
+
+# Hub Radarr/Sonarr push their resource updates on
+HUB_PATH = "signalr/messages"
+# Every SignalR message ends with this record separator
+RECORD_SEPARATOR = "\x1e"
+# SignalR message types
+MESSAGE_INVOCATION = 1
+MESSAGE_PING = 6
+MESSAGE_CLOSE = 7
+# The server pings every 15 seconds, so a silent stream longer than this is dead
+STREAM_READ_TIMEOUT = 35
+# Longest wait between reconnection attempts (seconds)
+MAX_RECONNECT_DELAY = 120
+
+
+class SignalRError(Exception):
+    pass
+
+def parse_records(payload):
+    """Split an SSE data payload into SignalR JSON messages"""
+    return [json.loads(record) for record in payload.split(RECORD_SEPARATOR) if record.strip()]
+
+class SignalRListener(threading.Thread):
+    """Follows the command updates a Radarr/Sonarr server pushes over SignalR
+
+    Uses the Server-Sent Events transport, which only needs plain HTTP
+    requests. on_command is called with the command resource of every
+    command update, connected is set while the stream is up.
+    """
+    
+    def __init__(self, manager, on_command):
+        super().__init__(name=f"HelparrSignalR-{manager}")
+        self.daemon = True
+        self.manager = manager
+        self.on_command = on_command
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.response = None
+    
+    def stop(self):
+        self.stopped.set()
+        response = self.response
+        if response is not None:
+            # Closing waits for the blocked read to return, at the latest
+            # with the next ping, the service must not wait for that
+            threading.Thread(target=response.close, name=f"{self.name}-close", daemon=True).start()
+    
+    def run(self):
+        delay = 5
+        while not self.stopped.is_set():
+            try:
+                self.listen()
+                delay = 5
+            except Exception as e:
+                log.warning("%s SignalR connection failed, polling instead: %s", self.manager, e)
+            self.connected.clear()
+            if self.stopped.wait(delay):
+                break
+            delay = min(MAX_RECONNECT_DELAY, delay * 2)
+    
+    def listen(self):
+        # Imported here so that plugin invocations importing the service
+        # modules don't pay for it, the stream gets a session of its own as
+        # it holds on to its connection and the client may not use requests
+        import requests
+        
+        client = get_client(self.manager)
+        hub_url = f"{client.address.rstrip('/')}/{HUB_PATH}"
+        params = {"access_token": client.api_key}
+        session = requests.Session()
+        
+        # Negotiate a connection and make sure the server offers SSE
+        response = session.post(f"{hub_url}/negotiate", params=dict(params, negotiateVersion=1), timeout=client.timeout)
+        response.raise_for_status()
+        negotiation = response.json()
+        transports = [transport.get("transport") for transport in negotiation.get("availableTransports", [])]
+        if "ServerSentEvents" not in transports:
+            raise SignalRError(f"Server-Sent Events not offered, only {transports}")
+        params["id"] = negotiation.get("connectionToken") or negotiation.get("connectionId")
+        
+        self.response = session.get(hub_url, params=params, stream=True,
+                                    headers={"Accept": "text/event-stream"},
+                                    timeout=(client.timeout[0], STREAM_READ_TIMEOUT))
+        try:
+            self.response.raise_for_status()
+            self.response.encoding = "utf-8"
+            
+            # Messages to the server go through separate POSTs
+            handshake = json.dumps({"protocol": "json", "version": 1}) + RECORD_SEPARATOR
+            session.post(hub_url, params=params, data=handshake.encode("utf-8"), timeout=client.timeout).raise_for_status()
+            
+            data = []
+            for line in self.response.iter_lines(chunk_size=1, decode_unicode=True):
+                if self.stopped.is_set():
+                    return
+                if line.startswith("data:"):
+                    data.append(line[5:].lstrip(" "))
+                elif not line and data:
+                    self.dispatch("\n".join(data))
+                    data = []
+        finally:
+            self.response.close()
+            self.response = None
+            session.close()
+    
+    def dispatch(self, payload):
+        for message in parse_records(payload):
+            message_type = message.get("type")
+            if message_type is None:
+                # Empty handshake response, the stream is ready
+                if not self.connected.is_set():
+                    log.info("%s SignalR connected", self.manager)
+                self.connected.set()
+            elif message_type == MESSAGE_CLOSE:
+                raise SignalRError(f"Closed by server: {message.get('error')}")
+            elif message_type == MESSAGE_INVOCATION:
+                for argument in message.get("arguments", []):
+                    if isinstance(argument, dict) and argument.get("name") == "command":
+                        resource = argument.get("body", {}).get("resource")
+                        if isinstance(resource, dict):
+                            self.on_command(self.manager, resource)
@@ -0,0 +1,124 @@
+# General python libs
+import hashlib, json, os, threading, time
+
+# Kodi libs
+import xbmcgui, xbmc
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.cache import get_cache_path
+
+# Home window, its properties are shared between all add-on processes
+HOME_WINDOW_ID = 10000
+# A lease older than this (seconds) belongs to a crashed invocation
+LEASE_TIMEOUT = 120
+
+
+class SingleFlight:
+    """Cross-process guard that lets only one invocation do the work for a key
+
+    The lease is a lock file created atomically with O_EXCL, other
+    invocations wait for it to be released and then pick up the result the
+    owner left in a Home window property. The owner renews the lease while
+    it works, so only the leases of crashed invocations expire.
+    """
+    
+    def __init__(self, key, lease_timeout=LEASE_TIMEOUT):
+        self.key = key
+        self.lease_timeout = lease_timeout
+        lock_path = os.path.join(get_cache_path(), "locks")
+        os.makedirs(lock_path, exist_ok=True)
+        # Keys carry plugin parameters, hashing keeps them out of the path
+        self.lock_file = os.path.join(lock_path, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+        self.result_property = f"helparr.flight.{key}"
+        self.owner = False
+        self.released = threading.Event()
+    
+    def _try_lock(self):
+        try:
+            fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+    
+    def _renew(self):
+        """Keep touching the lock file until the lease is released"""
+        while not self.released.wait(self.lease_timeout / 4):
+            try:
+                os.utime(self.lock_file)
+            except OSError as e:
+                log.warning("Failed to renew lease for %s: %s", self.key, e)
+    
+    def _lease_expired(self):
+        try:
+            return time.time() - os.path.getmtime(self.lock_file) > self.lease_timeout
+        except OSError:
+            return False  # Released in the meantime
+    
+    def acquire(self):
+        """Try to become the owner, breaking leases of crashed invocations"""
+        if self._try_lock():
+            self.owner = True
+        elif self._lease_expired():
+            log.warning("Breaking expired lease for %s", self.key)
+            try:
+                os.remove(self.lock_file)
+            except OSError:
+                pass
+            self.owner = self._try_lock()
+        if self.owner:
+            self.released.clear()
+            threading.Thread(target=self._renew, name=f"lease_{self.key}", daemon=True).start()
+        return self.owner
+    
+    def release(self, result=None, publish=True):
+        """Publish the result for waiting invocations and give up the lease"""
+        if not self.owner:
+            return
+        self.released.set()
+        if publish:
+            xbmcgui.Window(HOME_WINDOW_ID).setProperty(self.result_property, json.dumps({"time": time.time(), "result": result}))
+        try:
+            os.remove(self.lock_file)
+        except OSError:
+            pass
+        self.owner = False
+    
+    def acquire_or_wait(self):
+        """Become the owner or wait for the current owner to finish
+
+        Returns None when this invocation owns the flight and has to do the
+        work, otherwise the result the owner published.
+        """
+        # Taken first, the owner may publish right after the failed acquire
+        started = time.time()
+        if self.acquire():
+            return None
+        
+        log.debug("%s is already in progress, waiting for its result", self.key)
+        window = xbmcgui.Window(HOME_WINDOW_ID)
+        
+        def published_result():
+            value = window.getProperty(self.result_property)
+            if value:
+                published = json.loads(value)
+                if published["time"] >= started:
+                    return True, published["result"]
+            return False, None
+        
+        while True:
+            xbmc.sleep(250)
+            found, result = published_result()
+            if found:
+                return result
+            if self.acquire():
+                # The owner publishes before it lets go of the lock, so it
+                # may have finished right after the check above
+                found, result = published_result()
+                if found:
+                    self.release(publish=False)
+                    return result
+                # The owner went away without publishing anything
+                return None
@@ -0,0 +1,309 @@
+# General python libs
+import json, os, sqlite3, threading
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.cache import get_cache_path
+
+DB_FILE = "helparr.db"
+
+# Schema migrations, the index + 1 is the schema version they lead to
+MIGRATIONS = [
+    [
+        """CREATE TABLE profiles (
+            manager TEXT NOT NULL, id INTEGER NOT NULL, name TEXT NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL,
+            PRIMARY KEY (manager, id))""",
+        """CREATE TABLE profile_settings (
+            manager TEXT NOT NULL, setting_index INTEGER NOT NULL, profile_id INTEGER NOT NULL,
+            PRIMARY KEY (manager, setting_index))""",
+        """CREATE TABLE root_folders (
+            manager TEXT NOT NULL, id INTEGER NOT NULL, path TEXT NOT NULL, free_space INTEGER, data TEXT NOT NULL,
+            PRIMARY KEY (manager, id))""",
+        """CREATE TABLE tags (
+            manager TEXT NOT NULL, id INTEGER NOT NULL, label TEXT NOT NULL,
+            PRIMARY KEY (manager, id))""",
+        """CREATE TABLE library (
+            manager TEXT NOT NULL, external_id TEXT NOT NULL, content_id INTEGER, title TEXT,
+            PRIMARY KEY (manager, external_id))""",
+        """CREATE TABLE episodes (
+            series_id INTEGER NOT NULL, season INTEGER NOT NULL, episode INTEGER NOT NULL, episode_id INTEGER NOT NULL,
+            PRIMARY KEY (series_id, season, episode))""",
+        """CREATE TABLE meta (
+            key TEXT PRIMARY KEY, value TEXT)""",
+    ],
+    [
+        """CREATE TABLE metrics (
+            phase TEXT NOT NULL, manager TEXT NOT NULL, seconds REAL NOT NULL, recorded REAL NOT NULL)""",
+        "CREATE INDEX metrics_phase ON metrics (phase, manager, recorded)",
+    ],
+    [
+        """CREATE TABLE journal (
+            id INTEGER PRIMARY KEY, manager TEXT NOT NULL, external_id TEXT NOT NULL, request TEXT NOT NULL,
+            state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL,
+            created REAL NOT NULL, last_error TEXT)""",
+        "CREATE INDEX journal_due ON journal (state, next_attempt)",
+    ],
+    [
+        # Series IDs are only unique per Sonarr instance, the cache is rebuilt on demand
+        "DROP TABLE episodes",
+        """CREATE TABLE episodes (
+            manager TEXT NOT NULL, series_id INTEGER NOT NULL, season INTEGER NOT NULL, episode INTEGER NOT NULL, episode_id INTEGER NOT NULL,
+            PRIMARY KEY (manager, series_id, season, episode))""",
+    ],
+    [
+        # Lookup results are the same on every instance, manager is Radarr or Sonarr
+        """CREATE TABLE lookups (
+            manager TEXT NOT NULL, external_id TEXT NOT NULL, data TEXT NOT NULL, fetched REAL NOT NULL,
+            PRIMARY KEY (manager, external_id))""",
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Connections can't be shared between threads, e.g. the bulk add workers
+_local = threading.local()
+
+
+def _import_legacy_files(conn):
+    """Move the data of the JSON cache files used before the database"""
+    cache_path = get_cache_path()
+    for manager in ("Radarr", "Sonarr"):
+        profiles_file = os.path.join(cache_path, f"{manager.lower()}_profiles.json")
+        mapping_file = os.path.join(cache_path, f"{manager.lower()}_profile_mapping.json")
+        try:
+            if os.path.exists(profiles_file):
+                with open(profiles_file, 'r') as f:
+                    _replace_profiles(conn, manager, json.load(f))
+            if os.path.exists(mapping_file):
+                with open(mapping_file, 'r') as f:
+                    _replace_profile_settings(conn, manager, {int(k): v for k, v in json.load(f).items()})
+        except Exception as e:
+            log.error("Failed to import legacy %s profile cache: %s", manager, e)
+
+def _remove_legacy_files():
+    cache_path = get_cache_path()
+    for file_name in ("radarr_profiles.json", "radarr_profile_mapping.json", "sonarr_profiles.json",
+                      "sonarr_profile_mapping.json", "radarr_library.json", "sonarr_library.json", "sonarr_episodes.json",
+                      "command_durations.json"):
+        try:
+            os.remove(os.path.join(cache_path, file_name))
+        except OSError:
+            pass
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Another process may have migrated while we waited for the lock
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for statements in MIGRATIONS[version:]:
+            for statement in statements:
+                conn.execute(statement)
+        if version == 0:
+            _import_legacy_files(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    if version == 0:
+        _remove_legacy_files()
+    log.info("Migrated metadata store from schema %s to %s", version, SCHEMA_VERSION)
+
+def get_connection():
+    """Get this thread's connection to the metadata store"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(os.path.join(get_cache_path(), DB_FILE), timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _migrate(conn)
+        _local.conn = conn
+    return conn
+
+def _transaction(function, *args):
+    conn = get_connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return function(conn, *args)
+
+# Quality profiles
+
+def _replace_profiles(conn, manager, profiles):
+    conn.execute("DELETE FROM profiles WHERE manager = ?", (manager,))
+    conn.executemany("INSERT INTO profiles (manager, id, name, position, data) VALUES (?, ?, ?, ?, ?)",
+                     [(manager, profile["id"], profile.get("name", ""), position, json.dumps(profile)) for position, profile in enumerate(profiles)])
+
+def replace_profiles(manager, profiles):
+    _transaction(_replace_profiles, manager, profiles)
+
+def get_profiles(manager):
+    rows = get_connection().execute("SELECT data FROM profiles WHERE manager = ? ORDER BY position", (manager,))
+    return [json.loads(row["data"]) for row in rows]
+
+def get_profile(manager, profile_id):
+    row = get_connection().execute("SELECT data FROM profiles WHERE manager = ? AND id = ?", (manager, profile_id)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+def _replace_profile_settings(conn, manager, mapping):
+    conn.execute("DELETE FROM profile_settings WHERE manager = ?", (manager,))
+    conn.executemany("INSERT INTO profile_settings (manager, setting_index, profile_id) VALUES (?, ?, ?)",
+                     [(manager, setting_index, profile_id) for setting_index, profile_id in mapping.items()])
+
+def replace_profile_settings(manager, mapping):
+    """Store the settings dropdown index -> profile ID mapping"""
+    _transaction(_replace_profile_settings, manager, mapping)
+
+def get_profile_setting(manager, setting_index):
+    row = get_connection().execute("SELECT profile_id FROM profile_settings WHERE manager = ? AND setting_index = ?", (manager, setting_index)).fetchone()
+    return row["profile_id"] if row else None
+
+# Root folders and tags
+
+def _replace_root_folders(conn, manager, root_folders):
+    conn.execute("DELETE FROM root_folders WHERE manager = ?", (manager,))
+    conn.executemany("INSERT INTO root_folders (manager, id, path, free_space, data) VALUES (?, ?, ?, ?, ?)",
+                     [(manager, folder["id"], folder.get("path", ""), folder.get("freeSpace"), json.dumps(folder)) for folder in root_folders])
+
+def replace_root_folders(manager, root_folders):
+    _transaction(_replace_root_folders, manager, root_folders)
+
+def get_root_folders(manager):
+    rows = get_connection().execute("SELECT data FROM root_folders WHERE manager = ? ORDER BY id", (manager,))
+    return [json.loads(row["data"]) for row in rows]
+
+def _replace_tags(conn, manager, tags):
+    conn.execute("DELETE FROM tags WHERE manager = ?", (manager,))
+    conn.executemany("INSERT INTO tags (manager, id, label) VALUES (?, ?, ?)",
+                     [(manager, tag["id"], tag.get("label", "")) for tag in tags])
+
+def replace_tags(manager, tags):
+    _transaction(_replace_tags, manager, tags)
+
+def get_tags(manager):
+    rows = get_connection().execute("SELECT id, label FROM tags WHERE manager = ? ORDER BY label", (manager,))
+    return [{"id": row["id"], "label": row["label"]} for row in rows]
+
+# Library index
+
+def _replace_library(conn, manager, items):
+    conn.execute("DELETE FROM library WHERE manager = ?", (manager,))
+    conn.executemany("INSERT OR REPLACE INTO library (manager, external_id, content_id, title) VALUES (?, ?, ?, ?)",
+                     [(manager, str(external_id), content_id, title) for external_id, content_id, title in items])
+
+def replace_library(manager, items):
+    """Replace the library index of a manager with (external ID, internal ID, title) items"""
+    _transaction(_replace_library, manager, items)
+
+def upsert_library_item(manager, external_id, content_id, title):
+    get_connection().execute("INSERT OR REPLACE INTO library (manager, external_id, content_id, title) VALUES (?, ?, ?, ?)",
+                             (manager, str(external_id), content_id, title))
+
+def delete_library_item(manager, external_id):
+    get_connection().execute("DELETE FROM library WHERE manager = ? AND external_id = ?", (manager, str(external_id)))
+
+def get_library_item(manager, external_id):
+    """Get (internal ID, title) of a library item or None"""
+    row = get_connection().execute("SELECT content_id, title FROM library WHERE manager = ? AND external_id = ?", (manager, str(external_id))).fetchone()
+    return (row["content_id"], row["title"]) if row else None
+
+# Metadata lookup cache
+
+def set_lookup(manager, external_id, data, fetched):
+    get_connection().execute("INSERT OR REPLACE INTO lookups (manager, external_id, data, fetched) VALUES (?, ?, ?, ?)",
+                             (manager, str(external_id), json.dumps(data), fetched))
+
+def get_lookup(manager, external_id):
+    """Get (data, fetch time) of a lookup result or None"""
+    row = get_connection().execute("SELECT data, fetched FROM lookups WHERE manager = ? AND external_id = ?", (manager, str(external_id))).fetchone()
+    return (json.loads(row["data"]), row["fetched"]) if row else None
+
+def prune_lookups(before):
+    """Remove lookup results fetched before the given time"""
+    get_connection().execute("DELETE FROM lookups WHERE fetched < ?", (before,))
+
+# Episodes
+
+def _replace_episodes(conn, manager, series_id, episodes):
+    conn.execute("DELETE FROM episodes WHERE manager = ? AND series_id = ?", (manager, series_id))
+    conn.executemany("INSERT INTO episodes (manager, series_id, season, episode, episode_id) VALUES (?, ?, ?, ?, ?)",
+                     [(manager, series_id, season, episode, episode_id) for season, episode, episode_id in episodes])
+
+def replace_episodes(manager, series_id, episodes):
+    """Replace the (season, episode, episode ID) list of a series"""
+    _transaction(_replace_episodes, manager, series_id, episodes)
+
+def get_episode(manager, series_id, season, episode):
+    row = get_connection().execute("SELECT episode_id FROM episodes WHERE manager = ? AND series_id = ? AND season = ? AND episode = ?",
+                                   (manager, series_id, season, episode)).fetchone()
+    return row["episode_id"] if row else None
+
+# Key/value metadata
+
+def get_meta(key, default=None):
+    row = get_connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row["value"]) if row else default
+
+def set_meta(key, value):
+    get_connection().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+def _increment_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    value = json.loads(row["value"]) if row else 0
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value + 1)))
+    return value
+
+def increment_meta(key):
+    """Increment a counter, returns its value before, 0 for new counters"""
+    return _transaction(_increment_meta, key)
+
+# Latency samples
+
+def _add_metrics(conn, samples, keep):
+    conn.executemany("INSERT INTO metrics (phase, manager, seconds, recorded) VALUES (?, ?, ?, ?)", samples)
+    for phase, manager in {(sample[0], sample[1]) for sample in samples}:
+        conn.execute("""DELETE FROM metrics WHERE phase = ? AND manager = ? AND rowid NOT IN (
+                            SELECT rowid FROM metrics WHERE phase = ? AND manager = ? ORDER BY recorded DESC LIMIT ?)""",
+                     (phase, manager, phase, manager, keep))
+
+def add_metrics(samples, keep):
+    """Store (phase, manager, seconds, recorded) latency samples, keeping only the latest samples of each phase"""
+    _transaction(_add_metrics, samples, keep)
+
+def get_metrics(since=0):
+    """Get {(phase, manager): [seconds, ...]} of the samples recorded after since"""
+    metrics = {}
+    for row in get_connection().execute("SELECT phase, manager, seconds FROM metrics WHERE recorded >= ?", (since,)):
+        metrics.setdefault((row["phase"], row["manager"]), []).append(row["seconds"])
+    return metrics
+
+# Add request journal
+
+def _add_journal_entry(conn, manager, external_id, request, now):
+    # A request already waiting for the same item is replaced instead of added twice
+    row = conn.execute("SELECT id FROM journal WHERE manager = ? AND external_id = ? AND state = 'pending'", (manager, str(external_id))).fetchone()
+    if row:
+        conn.execute("UPDATE journal SET request = ?, next_attempt = ? WHERE id = ?", (json.dumps(request), now, row["id"]))
+        return row["id"]
+    return conn.execute("INSERT INTO journal (manager, external_id, request, state, next_attempt, created) VALUES (?, ?, ?, 'pending', ?, ?)",
+                        (manager, str(external_id), json.dumps(request), now, now)).lastrowid
+
+def add_journal_entry(manager, external_id, request, now):
+    """Append a pending request, returns its entry ID"""
+    return _transaction(_add_journal_entry, manager, external_id, request, now)
+
+def get_due_journal_entries(now):
+    rows = get_connection().execute("SELECT * FROM journal WHERE state = 'pending' AND next_attempt <= ? ORDER BY id", (now,))
+    return [dict(row, request=json.loads(row["request"])) for row in rows]
+
+def get_next_journal_attempt():
+    """Get the time of the next pending attempt or None"""
+    row = get_connection().execute("SELECT MIN(next_attempt) AS next_attempt FROM journal WHERE state = 'pending'").fetchone()
+    return row["next_attempt"]
+
+def update_journal_entry(entry_id, state, attempts, next_attempt, last_error=None):
+    get_connection().execute("UPDATE journal SET state = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                             (state, attempts, next_attempt, last_error, entry_id))
+
+def prune_journal(before):
+    """Remove finished entries older than before"""
+    get_connection().execute("DELETE FROM journal WHERE state != 'pending' AND created < ?", (before,))
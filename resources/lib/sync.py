@@ -0,0 +1,57 @@
+# General python libs
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import arr_get, is_configured, manager_type
+from resources.lib.reference import REFERENCE_TTLS, revalidate
+from resources.lib.store import set_meta
+
+# Every request of a sync runs at once, there are only a handful
+SYNC_WORKERS = 10
+
+
+def _sync_status(manager):
+    status, response = arr_get(manager, "system/status", "")
+    if status:
+        system = response.json()
+        set_meta(f"system.{manager}", {"version": system.get("version"), "synced": time.time()})
+    else:
+        log.warning("Failed to get %s system status: %s", manager, log.Payload(response))
+    return status
+
+def _timed(function, *args):
+    started = time.time()
+    try:
+        success = function(*args)
+    except Exception as e:
+        log.error("Sync request failed: %s", e)
+        success = False
+    return success, time.time() - started
+
+def sync_all(managers, progress=None):
+    """Fetch the system status and all reference data of the managers concurrently
+
+    progress(done, total, result) is called from the calling thread after
+    every finished request. Returns [(manager, endpoint, success, seconds)]
+    in completion order.
+    """
+    managers = [manager for manager in managers if is_configured(manager)]
+    requests = [(manager, "system/status", _sync_status, (manager,)) for manager in managers]
+    requests += [(manager, endpoint, revalidate, (manager, endpoint, True)) for manager in managers for endpoint in REFERENCE_TTLS[manager_type(manager)]]
+    if not requests:
+        return []
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(SYNC_WORKERS, len(requests))) as executor:
+        futures = {executor.submit(_timed, function, *args): (manager, endpoint) for manager, endpoint, function, args in requests}
+        for future in as_completed(futures):
+            manager, endpoint = futures[future]
+            success, seconds = future.result()
+            result = (manager, endpoint, success, seconds)
+            log.debug("Synced %s %s in %.2fs, success: %s", manager, endpoint, seconds, success)
+            results.append(result)
+            if progress:
+                progress(len(results), len(requests), result)
+    return results
@@ -0,0 +1,143 @@
+# General python libs
+import threading, time
+from urllib.parse import urlencode
+
+# Kodi libs
+import xbmcgui, xbmcplugin
+
+# Helparr libs
+from resources.lib import log
+from resources.lib.api import configured_instances, instance_name, manager_type, INSTANCES
+from resources.lib.browse import describe, fetch_page, list_item
+from resources.lib.store import get_meta, set_meta
+
+# Home window, its properties are shared between all add-on processes
+HOME_WINDOW_ID = 10000
+# Widget feeds, the browse list each is built from and their name in the menus
+WIDGETS = {
+    "recent": ("recent", "Recently added"),
+    "downloading": ("queue", "Downloading now"),
+    "upcoming": ("calendar", "Upcoming")
+}
+# Items per feed
+WIDGET_SIZE = 25
+# Time (seconds) after which the service refreshes a feed, our own adds and
+# tracked downloads refresh them right away
+WIDGET_TTLS = {"recent": 30 * 60, "downloading": 2 * 60, "upcoming": 6 * 60 * 60}
+# Feeds nobody looked at for this long (seconds) are left alone until viewed again
+WIDGET_IDLE_TIME = 24 * 60 * 60
+# Window property set whenever a feed changed, skins can add it to widget
+# paths, e.g. &updated=$INFO[Window(Home).Property(helparr.widgets.updated)],
+# so that their widgets reload right away
+UPDATED_PROPERTY = "helparr.widgets.updated"
+
+
+def _key(manager, feed):
+    return f"widget.{manager}.{feed}"
+
+def _viewed_property(manager, feed):
+    return f"helparr.widgets.viewed.{manager}.{feed}"
+
+def _url(base_url, **params):
+    return f"{base_url}?{urlencode(params)}"
+
+def refresh_feed(manager, feed):
+    """Fetch the items of a feed and store them, returns True if they changed"""
+    records, _ = fetch_page(WIDGETS[feed][0], manager, 1)
+    if records is None:
+        log.warning("Failed to refresh %s %s widget", manager, feed)
+        return False
+    items = [describe(WIDGETS[feed][0], manager, record) for record in records[:WIDGET_SIZE]]
+    entry = get_meta(_key(manager, feed)) or {}
+    # JSON turns the search tuples into lists, compare in the stored form
+    changed = [dict(item, search=list(item["search"])) for item in items] != entry.get("items")
+    set_meta(_key(manager, feed), {"items": items, "updated": time.time()})
+    log.debug("Refreshed %s %s widget, %s items, changed: %s", manager, feed, len(items), changed)
+    return changed
+
+def list_widgets(handle, base_url):
+    """List the widget feeds of all configured managers for skins to pick from"""
+    items = []
+    for manager in configured_instances():
+        for feed, (_, name) in WIDGETS.items():
+            items.append((_url(base_url, widget=feed, manager=manager), xbmcgui.ListItem(f"{instance_name(manager)} {name}", offscreen=True), True))
+    xbmcplugin.addDirectoryItems(handle, items, len(items))
+    xbmcplugin.endOfDirectory(handle)
+    return True
+
+def list_widget(handle, feed, manager):
+    """List a widget feed from its stored items, never asks the server
+
+    Viewing a feed marks it as in use, so the service starts keeping it
+    fresh. A feed viewed for the first time is empty until the service
+    refreshed it a moment later.
+    """
+    if feed not in WIDGETS or manager not in INSTANCES:
+        log.error("Unknown widget %s %s", manager, feed)
+        xbmcplugin.endOfDirectory(handle, succeeded=False)
+        return False
+    xbmcgui.Window(HOME_WINDOW_ID).setProperty(_viewed_property(manager, feed), str(time.time()))
+    entry = get_meta(_key(manager, feed)) or {}
+    items = [("", list_item(description), False) for description in entry.get("items", [])]
+    xbmcplugin.setContent(handle, "movies" if manager_type(manager) == "Radarr" else "episodes")
+    xbmcplugin.addDirectoryItems(handle, items, len(items))
+    xbmcplugin.endOfDirectory(handle, cacheToDisc=False)
+    return True
+
+class WidgetRefresher:
+    """Keeps the widget feeds that are in use fresh, runs in the service
+
+    Feeds are refreshed in a background thread once their TTL passed or
+    right away after they were invalidated, e.g. by one of our adds or a
+    tracked download. Whenever the items of a feed changed the updated
+    window property is set, which lets skins reload their widgets.
+    """
+
+    def __init__(self):
+        self.window = xbmcgui.Window(HOME_WINDOW_ID)
+        # {(manager, feed): time of the last refresh}
+        self.updated = {}
+        # Feeds to refresh on the next tick no matter their age
+        self.invalidated = set()
+        # Feeds being refreshed
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def invalidate(self, manager, feeds=None):
+        """Refresh feeds of a manager, all of them without feeds, on the next tick"""
+        with self.lock:
+            self.invalidated.update((manager, feed) for feed in feeds or WIDGETS)
+
+    def last_update(self, key):
+        if key not in self.updated:
+            self.updated[key] = (get_meta(_key(*key)) or {}).get("updated", 0)
+        return self.updated[key]
+
+    def tick(self, now):
+        for manager in configured_instances():
+            for feed in WIDGETS:
+                key = (manager, feed)
+                try:
+                    viewed = float(self.window.getProperty(_viewed_property(manager, feed)))
+                except ValueError:
+                    continue
+                with self.lock:
+                    if key in self.running or now - viewed > WIDGET_IDLE_TIME:
+                        continue
+                    if key not in self.invalidated and now - self.last_update(key) < WIDGET_TTLS[feed]:
+                        continue
+                    self.invalidated.discard(key)
+                    self.running.add(key)
+                threading.Thread(target=self.refresh, args=key, name=f"widget_{manager}_{feed}", daemon=True).start()
+
+    def refresh(self, manager, feed):
+        try:
+            if refresh_feed(manager, feed):
+                self.window.setProperty(UPDATED_PROPERTY, str(time.time()))
+        except Exception as e:
+            log.error("Refreshing %s %s widget failed: %s", manager, feed, e)
+        finally:
+            with self.lock:
+                # Failed refreshes are retried after the TTL as well
+                self.updated[(manager, feed)] = time.time()
+                self.running.discard((manager, feed))
@@ -0,0 +1,8 @@
+# Helparr libs
+from resources.lib import log
+from resources.lib.monitor import CommandScheduler
+
+# Background service monitoring the commands started by plugin invocations
+if __name__ == "__main__":
+    log.set_role("service")
+    CommandScheduler().run()